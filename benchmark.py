@@ -0,0 +1,740 @@
+"""Benchmarks for the stock market analysis program.
+
+The suite generates a synthetic market of .csv and .trp files and reports
+the time, throughput and peak memory of loading and analysing it as JSON, to
+be kept as a baseline against which to judge performance changes. The
+comparisons time the current implementation against reference copies of the
+original code.
+
+Run with:
+    python benchmark.py [--stocks N] [--days N] [--seed N] [--output FILE]
+    python benchmark.py --compare
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+import tracemalloc
+
+import stock_analysis
+import stock_cross_section
+import stocks
+
+ONE_DAY = datetime.timedelta(days=1)
+CSV_FORMAT = "{0},{1},{2:.3f},{3:.3f},{4:.3f},{5:.3f},{6}\n"
+TRIPLET_FORMAT = ("{0}:DATE:{1}\n{0}:OPEN:{2:.3f}\n{0}:HIGH:{3:.3f}\n"
+                  "{0}:LOW:{4:.3f}\n{0}:CLOSE:{5:.3f}\n{0}:VOLUME:{6}\n")
+
+
+class LegacyTradingData(object):
+    """Reference copy of the original TradingData, which stored its fields in
+    a per-instance __dict__.
+    """
+
+    def __init__(self, date, day_open, day_high, day_low, day_close, volume):
+        self._date = date
+        self._open = day_open
+        self._high = day_high
+        self._low = day_low
+        self._close = day_close
+        self._volume = volume
+
+
+class LegacyStock(object):
+    """Reference copy of the original dictionary backed Stock, which kept one
+    TradingData object per day of trading.
+    """
+
+    def __init__(self, code):
+        self._code = code
+        self._trading_data = {}
+
+    def add_day_data(self, day):
+        self._trading_data[day.get_date()] = day
+
+    def analyse(self, analyser):
+        for date in sorted(self._trading_data.keys()):
+            analyser.process(self._trading_data[date])
+
+
+class LegacyHighLow(stocks.Analyser):
+    """Reference copy of the original HighLow, which sorted every high and
+    low seen so far on each day processed.
+    """
+
+    def __init__(self):
+        self._total_high = []
+        self._total_low = []
+
+    def process(self, day):
+        self._total_high.append(day.get_high())
+        self._total_high.sort()
+        self._total_low.append(day.get_low())
+        self._total_low.sort()
+
+    def result(self):
+        return self._total_high[-1], self._total_low[0]
+
+
+class LegacyMovingAverage(stocks.Analyser):
+    """Reference copy of the original MovingAverage, which trimmed its list
+    one day at a time and summed the whole window on each day processed.
+    """
+
+    def __init__(self, num_days):
+        self._num_days = num_days
+        self._closing_total = 0
+        self._data = []
+
+    def process(self, day):
+        self._data.append(day.get_close())
+        if self._num_days <= 0 or type(self._num_days) == float:
+            raise ValueError('please enter valid day/s.')
+        if len(self._data) >= self._num_days:
+            while len(self._data) > self._num_days:
+                del self._data[0]
+            self._closing_total = sum(self._data)
+
+    def result(self):
+        return self._closing_total / self._num_days
+
+
+class LegacyLoadCSV(stocks.Loader):
+    """Reference copy of the original LoadCSV, which parsed and added one
+    line at a time.
+    """
+
+    def _process(self, file):
+        for data in file:
+            datalist = data.split(",")
+            if len(datalist) == 7 and len(datalist[0]) >= 3:
+                stock = self._stocks.get_stock(datalist[0])
+                try:
+                    int(datalist[1])
+                    stock.add_day_data(stocks.TradingData(
+                        str(datalist[1]), float(datalist[2]),
+                        float(datalist[3]), float(datalist[4]),
+                        float(datalist[5]), int(datalist[6])))
+                except ValueError:
+                    raise RuntimeError('invalid data format.')
+            else:
+                raise RuntimeError('the file must be a .csv file.')
+
+
+class LegacyStockCollection(stocks.StockCollection):
+    """Reference copy of the original get_stock, which created a Stock on
+    every lookup and stored the result again.
+    """
+
+    def get_stock(self, stock_code):
+        self._all_stocks[stock_code] = self._all_stocks.get(
+            stock_code, stocks.Stock(stock_code))
+        return self._all_stocks[stock_code]
+
+
+def generate_days(num_days, start=datetime.date(2000, 1, 3), seed=0):
+    """Generate a random walk of daily trading data.
+
+    Parameters:
+        num_days (int): Number of days of trading data to generate.
+        start (datetime.date): First date. Weekends are skipped.
+        seed (int): Seed for the random number generator.
+
+    Returns:
+        list<TradingData>: Trading data for consecutive weekdays, in date
+        order.
+    """
+    rand = random.Random(seed)
+    price = rand.uniform(1.0, 100.0)
+    date = start
+    days = []
+    for _ in range(num_days):
+        while date.weekday() >= 5:
+            date += ONE_DAY
+        day_open = max(0.01, price * (1 + rand.gauss(0, 0.01)))
+        day_close = max(0.01, day_open * (1 + rand.gauss(0, 0.02)))
+        day_high = max(day_open, day_close) * (1 + rand.uniform(0, 0.01))
+        day_low = min(day_open, day_close) * (1 - rand.uniform(0, 0.01))
+        days.append(stocks.TradingData(date.strftime("%Y%m%d"), day_open,
+                                       day_high, day_low, day_close,
+                                       rand.randint(1000, 1000000)))
+        price = day_close
+        date += ONE_DAY
+    return days
+
+
+def stock_code(number):
+    """(str) The stock code used for the stock numbered 'number'."""
+    return "S{0:04d}".format(number)
+
+
+def write_csv(filename, num_stocks, num_days):
+    """Write a .csv file holding 'num_days' days of trading data for each of
+    'num_stocks' stocks, ordered by date and then by stock code.
+    """
+    days = generate_days(num_days)
+    with open(filename, "w") as file:
+        for day in days:
+            for number in range(num_stocks):
+                file.write(CSV_FORMAT.format(stock_code(number),
+                                             day.get_date(), day.get_open(),
+                                             day.get_high(), day.get_low(),
+                                             day.get_close(), day.get_volume()))
+
+
+def generate_market(directory, num_stocks, num_days, seed=0):
+    """Write synthetic trading data to one .csv and one .trp file.
+
+    Each stock has its own random walk. Both files hold the same data,
+    ordered by stock code and then by date, and only one stock's data is in
+    memory at a time.
+
+    Parameters:
+        directory (str): Directory in which to write the files.
+        num_stocks (int): Number of stocks.
+        num_days (int): Number of days of trading data for each stock.
+        seed (int): Seed for the random number generator.
+
+    Returns:
+        tuple<str, str>: Names of the .csv file and the .trp file.
+    """
+    csv_name = os.path.join(directory, "market.csv")
+    triplet_name = os.path.join(directory, "market.trp")
+    with open(csv_name, "w") as csv_file, open(triplet_name, "w") as trp_file:
+        for number in range(num_stocks):
+            code = stock_code(number)
+            for day in generate_days(num_days, seed=seed + number):
+                values = (day.get_date(), day.get_open(), day.get_high(),
+                          day.get_low(), day.get_close(), day.get_volume())
+                csv_file.write(CSV_FORMAT.format(code, *values))
+                trp_file.write(TRIPLET_FORMAT.format(code, *values))
+    return csv_name, triplet_name
+
+
+def timed(function, *args, repeat=3):
+    """Return the best wall time in seconds of 'repeat' calls to 'function'."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def build_stocks(stock_class, num_stocks, days):
+    """Return 'num_stocks' instances of 'stock_class' holding 'days'.
+
+    Each stock receives fresh copies of the trading data, as it would when
+    loaded from a file.
+    """
+    built = []
+    for code in range(num_stocks):
+        stock = stock_class(stock_code(code))
+        for day in days:
+            stock.add_day_data(stocks.TradingData(
+                day.get_date(), day.get_open(), day.get_high(), day.get_low(),
+                day.get_close(), day.get_volume()))
+        built.append(stock)
+    return built
+
+
+def bench_storage(num_stocks=200, num_days=2500):
+    """Compare memory use and iteration speed of the columnar Stock against
+    the original dictionary of TradingData objects.
+
+    Returns:
+        dict: Peak memory in bytes and analysis time in seconds, per storage.
+    """
+    days = generate_days(num_days)
+    results = {}
+    for name, stock_class in (("legacy", LegacyStock),
+                              ("columnar", stocks.Stock)):
+        tracemalloc.start()
+        built = build_stocks(stock_class, num_stocks, days)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        analyser = stocks.AverageVolume()
+
+        def analyse_all():
+            for stock in built:
+                analyser.reset()
+                stock.analyse(analyser)
+
+        results[name] = {"memory": memory, "analyse": timed(analyse_all)}
+        del built
+    return results
+
+
+class PerDay(object):
+    """Adapter that hides an analyser's 'process_batch' method, so that
+    Stock.analyse falls back to calling 'process' once per day.
+    """
+
+    def __init__(self, analyser):
+        self._analyser = analyser
+
+    def process(self, day):
+        self._analyser.process(day)
+
+
+def bench_batch(num_days=2500, repeat=20):
+    """Compare per-day and batch processing for each built-in analyser.
+
+    Returns:
+        dict: Time in seconds of 'repeat' analyses, per analyser and path.
+    """
+    stock = stocks.Stock("BENCH")
+    for day in generate_days(num_days):
+        stock.add_day_data(day)
+    factories = (("AverageVolume", stocks.AverageVolume),
+                 ("HighLow", stock_analysis.HighLow),
+                 ("MovingAverage", lambda: stock_analysis.MovingAverage(10)),
+                 ("GapUp", lambda: stock_analysis.GapUp(0.011)))
+    results = {}
+    for name, factory in factories:
+        def per_day():
+            for _ in range(repeat):
+                stock.analyse(PerDay(factory()))
+
+        def batch():
+            for _ in range(repeat):
+                stock.analyse(factory())
+
+        results[name] = {"per_day": timed(per_day), "batch": timed(batch)}
+    return results
+
+
+def bench_trading_data(count=200000):
+    """Compare the memory and construction speed of TradingData against the
+    original class with a per-instance __dict__.
+
+    Returns:
+        dict: Bytes per instance and instances created per second, per
+        class and method of construction.
+    """
+    days = generate_days(1000)
+    columns = [list(column) * (count // len(days)) for column in zip(*(
+        (day.get_date(), day.get_open(), day.get_high(), day.get_low(),
+         day.get_close(), day.get_volume()) for day in days))]
+    results = {}
+    constructors = (
+        ("legacy", lambda: [LegacyTradingData(*row) for row in zip(*columns)]),
+        ("slotted", lambda: [stocks.TradingData(*row)
+                             for row in zip(*columns)]),
+        ("from_columns", lambda: stocks.TradingData.from_columns(*columns)))
+    for name, construct in constructors:
+        tracemalloc.start()
+        built = construct()
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del built
+        results[name] = {"bytes_per_instance": memory / count,
+                         "per_second": count / timed(construct)}
+    return results
+
+
+def bench_get_stock(num_stocks=2000, lookups=500000):
+    """Compare stock lookups through the original get_stock, the current
+    get_stock and get_stocks.
+
+    Returns:
+        dict: Time in seconds for all lookups, per method.
+    """
+    codes = [stock_code(number % num_stocks) for number in range(lookups)]
+
+    def one_at_a_time(collection):
+        for code in codes:
+            collection.get_stock(code)
+
+    return {"legacy": timed(one_at_a_time, LegacyStockCollection()),
+            "get_stock": timed(one_at_a_time, stocks.StockCollection()),
+            "get_stocks": timed(
+                lambda: stocks.StockCollection().get_stocks(codes))}
+
+
+def bench_high_low(num_days=3000, window=250):
+    """Compare HighLow and RollingHighLow against the original HighLow on
+    over ten years of daily data, processing one day at a time.
+
+    Returns:
+        dict: Time in seconds of one analysis, per analyser.
+    """
+    stock = stocks.Stock("BENCH")
+    for day in generate_days(num_days):
+        stock.add_day_data(day)
+    analysers = (("legacy", LegacyHighLow),
+                 ("streaming", stock_analysis.HighLow),
+                 ("rolling", lambda: stock_analysis.RollingHighLow(window)))
+    return {name: timed(lambda: stock.analyse(PerDay(factory())))
+            for name, factory in analysers}
+
+
+def bench_moving_average(num_days=3000, window=200):
+    """Compare the ring buffer moving averages against the original
+    MovingAverage, processing one day at a time.
+
+    Returns:
+        dict: Time in seconds of one analysis, per analyser.
+    """
+    stock = stocks.Stock("BENCH")
+    for day in generate_days(num_days):
+        stock.add_day_data(day)
+    analysers = (
+        ("legacy", lambda: LegacyMovingAverage(window)),
+        ("simple", lambda: stock_analysis.MovingAverage(window)),
+        ("series", lambda: stock_analysis.MovingAverage(window, series=True)),
+        ("weighted", lambda: stock_analysis.WeightedMovingAverage(window)),
+        ("exponential",
+         lambda: stock_analysis.ExponentialMovingAverage(window)))
+    return {name: timed(lambda: stock.analyse(PerDay(factory())))
+            for name, factory in analysers}
+
+
+def bench_repeated_analyse(num_days=5000, repeat=100):
+    """Compare repeated analyses of one long history, which the original
+    Stock sorted on every call, and loading that history in reverse order.
+
+    Returns:
+        dict: Time in seconds, per storage and step.
+    """
+    days = generate_days(num_days)
+    last_month = days[-20].get_date()
+    results = {}
+    for name, stock_class in (("legacy", LegacyStock),
+                              ("columnar", stocks.Stock)):
+        stock = stock_class("BENCH")
+
+        def load_reversed():
+            for day in reversed(days):
+                stock.add_day_data(day)
+            stock.analyse(stocks.AverageVolume())
+
+        def analyse_repeatedly():
+            for _ in range(repeat):
+                stock.analyse(stocks.AverageVolume())
+
+        results[name] = {"load_reversed": timed(load_reversed, repeat=1),
+                         "analyse": timed(analyse_repeatedly, repeat=1)}
+    columnar = stock
+
+    def analyse_range():
+        for _ in range(repeat):
+            columnar.analyse(stocks.AverageVolume(), start=last_month)
+
+    results["columnar"]["analyse_last_month"] = timed(analyse_range)
+    return results
+
+
+def bench_incremental(num_days=5000, new_days=20):
+    """Compare replaying a stock's whole history against resuming from a
+    checkpoint, when one new day arrives at a time.
+
+    Returns:
+        dict: Time in seconds to analyse after each of 'new_days' new days,
+        per method.
+    """
+    days = generate_days(num_days + new_days)
+    factory = lambda: stock_analysis.MovingAverage(10, series=True)
+    results = {}
+    for name in ("replay", "incremental"):
+        stock = stocks.Stock("BENCH")
+        for day in days[:num_days]:
+            stock.add_day_data(day)
+        checkpoint = stock.analyse_incremental(factory())
+
+        def nightly():
+            nonlocal checkpoint
+            for day in days[num_days:]:
+                stock.add_day_data(day)
+                if name == "replay":
+                    stock.analyse(factory())
+                else:
+                    checkpoint = stock.analyse_incremental(factory(),
+                                                           checkpoint)
+
+        results[name] = timed(nightly, repeat=1)
+    return results
+
+
+def bench_csv(num_stocks=1000, num_days=2000):
+    """Compare LoadCSV against the original line by line loader on a file of
+    num_stocks x num_days rows.
+
+    Returns:
+        dict: Time in seconds to load the file, per loader.
+    """
+    directory = tempfile.mkdtemp()
+    filename = os.path.join(directory, "bench.csv")
+    try:
+        write_csv(filename, num_stocks, num_days)
+        loaders = (("legacy", LegacyLoadCSV),
+                   ("chunked", stock_analysis.LoadCSV))
+        return {name: timed(lambda: loader(filename, stocks.StockCollection()),
+                            repeat=1)
+                for name, loader in loaders}
+    finally:
+        os.remove(filename)
+        os.rmdir(directory)
+
+
+def bench_load_many(num_files=16, num_stocks=500, num_days=100):
+    """Compare loading many .csv files in one process against loading them
+    in parallel with StockCollection.load_many.
+
+    Returns:
+        dict: Time in seconds to load all files, per number of workers.
+    """
+    directory = tempfile.mkdtemp()
+    filenames = [os.path.join(directory, "day{0}.csv".format(number))
+                 for number in range(num_files)]
+    try:
+        for filename in filenames:
+            write_csv(filename, num_stocks, num_days)
+        results = {}
+        for workers in (1, os.cpu_count()):
+            results[workers] = timed(lambda: stocks.StockCollection().load_many(
+                filenames, workers=workers), repeat=1)
+        return results
+    finally:
+        for filename in filenames:
+            os.remove(filename)
+        os.rmdir(directory)
+
+
+def bench_snapshot(num_stocks=2000, num_days=500):
+    """Compare loading a .csv file against reopening a snapshot of the same
+    data, and analysing one stock from the snapshot.
+
+    Returns:
+        dict: Time in seconds, per step.
+    """
+    directory = tempfile.mkdtemp()
+    csv_file = os.path.join(directory, "bench.csv")
+    snapshot = os.path.join(directory, "bench.snapshot")
+    try:
+        write_csv(csv_file, num_stocks, num_days)
+        collection = stocks.StockCollection()
+        results = {"load_csv": timed(
+            lambda: stock_analysis.LoadCSV(csv_file, collection), repeat=1)}
+        collection.save_snapshot(snapshot)
+        results["open_snapshot"] = timed(
+            lambda: stocks.StockCollection.open_snapshot(snapshot))
+        reopened = stocks.StockCollection.open_snapshot(snapshot)
+        results["analyse_one"] = timed(
+            lambda: reopened.get_stock("S0000").analyse(stocks.AverageVolume()))
+        return results
+    finally:
+        for filename in (csv_file, snapshot):
+            if os.path.exists(filename):
+                os.remove(filename)
+        os.rmdir(directory)
+
+
+class NoAnalysis(stocks.Analyser):
+    """Analyser that does nothing, used to time Stock.analyse's per-day
+    dispatch on its own.
+    """
+
+    def process(self, day):
+        pass
+
+    def reset(self):
+        pass
+
+    def result(self):
+        return None
+
+
+def measure(function, items):
+    """Time one call to 'function' and measure the peak memory allocated by
+    a second call.
+
+    Parameters:
+        function (callable): The step to measure, called with no arguments.
+        items (int): Number of items, such as rows or days, the step handles.
+
+    Returns:
+        dict: The wall time, items, throughput and peak memory of the step.
+    """
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": seconds, "items": items,
+            "items_per_second": items / seconds if seconds else None,
+            "peak_memory_bytes": peak}
+
+
+def run_suite(num_stocks=500, num_days=1000, seed=0, lookups=10):
+    """Time loading and analysing a synthetic market of num_stocks x
+    num_days days of trading data.
+
+    Parameters:
+        num_stocks (int): Number of stocks.
+        num_days (int): Number of days of trading data for each stock.
+        seed (int): Seed for the random number generator.
+        lookups (int): Number of times each stock is looked up.
+
+    Returns:
+        dict: The parameters of the run and the measurements of each step.
+    """
+    rows = num_stocks * num_days
+    codes = [stock_code(number) for number in range(num_stocks)]
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        csv_name, triplet_name = generate_market(directory, num_stocks,
+                                                 num_days, seed)
+        results["load_csv"] = measure(lambda: stock_analysis.LoadCSV(
+            csv_name, stocks.StockCollection()), rows)
+        results["load_csv_parallel"] = measure(lambda: stock_analysis.LoadCSV(
+            csv_name, stocks.StockCollection(), workers=None), rows)
+        results["load_triplet"] = measure(lambda: stock_analysis.LoadTriplet(
+            triplet_name, stocks.StockCollection()), rows)
+        collection = stocks.StockCollection()
+        stock_analysis.LoadCSV(csv_name, collection)
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    def look_up():
+        for _ in range(lookups):
+            for code in codes:
+                collection.get_stock(code)
+
+    results["get_stock"] = measure(look_up, lookups * num_stocks)
+
+    def analyse_all(factory):
+        def analyse():
+            for code in codes:
+                collection.get_stock(code).analyse(factory())
+        return analyse
+
+    results["analyse"] = measure(analyse_all(NoAnalysis), rows)
+    analysers = (("AverageVolume", stocks.AverageVolume),
+                 ("HighLow", stock_analysis.HighLow),
+                 ("MovingAverage", lambda: stock_analysis.MovingAverage(10)),
+                 ("GapUp", lambda: stock_analysis.GapUp(0.011)))
+    for name, factory in analysers:
+        results["analyser_" + name] = measure(analyse_all(factory), rows)
+
+    def query_all(query, *args):
+        def query_stocks():
+            for code in codes:
+                query(collection.get_stock(code), *args)
+        return query_stocks
+
+    results["analyse_all_pickled"] = measure(lambda: collection.analyse_all(
+        stock_analysis.HighLow, workers=2), rows)
+    with collection.publish() as shared:
+        results["analyse_all_shared"] = measure(lambda: shared.analyse_all(
+            stock_analysis.HighLow, workers=2), rows)
+    screener = stock_analysis.GapScreener(1.0, percentage=True)
+    results["gap_screen"] = measure(lambda: screener.screen(collection), rows)
+    section = stock_cross_section.CrossSection(collection)
+    results["cross_section"] = measure(
+        lambda: stock_cross_section.CrossSection(collection), rows)
+    results["correlation_matrix"] = measure(
+        section.correlation_matrix, num_stocks * num_stocks)
+    results["rank_top"] = measure(
+        lambda: section.top(stock_analysis.HighLow, 10, key=max), rows)
+    cache = stocks.ResultCache(num_stocks)
+
+    def analyse_cached():
+        for code in codes:
+            cache.analyse(collection.get_stock(code),
+                          stock_analysis.MovingAverage(10))
+
+    analyse_cached()
+    results["cached_MovingAverage"] = measure(analyse_cached, num_stocks)
+    results["range"] = measure(query_all(stocks.Stock.range), num_stocks)
+    for period in ("W", "M"):
+        results["resample_" + period] = measure(
+            query_all(stocks.Stock.resample, period), rows)
+    return {"parameters": {"stocks": num_stocks, "days": num_days,
+                           "seed": seed, "lookups": lookups},
+            "python": platform.python_version(),
+            "results": results}
+
+
+def compare():
+    """Print the comparisons of the current implementation against the
+    reference copies of the original code.
+    """
+    storage = bench_storage()
+    print("Storage of 200 stocks x 2500 days")
+    for name, result in storage.items():
+        print("  {0:<10} memory {1:>8.1f} MB  analyse {2:.3f} s".format(
+            name, result["memory"] / 2 ** 20, result["analyse"]))
+    print("Analysers, 20 analyses of 2500 days")
+    for name, result in bench_batch().items():
+        print("  {0:<14} per day {1:.3f} s  batch {2:.3f} s".format(
+            name, result["per_day"], result["batch"]))
+    print("TradingData, 200000 instances")
+    for name, result in bench_trading_data().items():
+        print("  {0:<14} {1:>6.1f} bytes  {2:>10.0f} per second".format(
+            name, result["bytes_per_instance"], result["per_second"]))
+    print("500000 stock lookups")
+    for name, result in bench_get_stock().items():
+        print("  {0:<10} {1:.3f} s".format(name, result))
+    print("HighLow, 3000 days processed one day at a time")
+    for name, result in bench_high_low().items():
+        print("  {0:<10} {1:.4f} s".format(name, result))
+    print("MovingAverage(200), 3000 days processed one day at a time")
+    for name, result in bench_moving_average().items():
+        print("  {0:<12} {1:.4f} s".format(name, result))
+    print("Stock with 5000 days, 100 analyses")
+    for name, result in bench_repeated_analyse().items():
+        for step, seconds in result.items():
+            print("  {0:<10} {1:<20} {2:.3f} s".format(name, step, seconds))
+    print("MovingAverage series over 5000 days, 20 new days")
+    for name, result in bench_incremental().items():
+        print("  {0:<12} {1:.4f} s".format(name, result))
+    print("LoadCSV, 1000 stocks x 2000 days (2 million rows)")
+    for name, result in bench_csv().items():
+        print("  {0:<10} {1:.2f} s".format(name, result))
+    print("load_many, 16 files of 50000 rows")
+    for workers, result in bench_load_many().items():
+        print("  {0:>2} workers {1:.2f} s".format(workers, result))
+    print("Snapshot of 2000 stocks x 500 days")
+    for name, result in bench_snapshot().items():
+        print("  {0:<14} {1:.4f} s".format(name, result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stocks", type=int, default=500,
+                        help="number of stocks in the synthetic market")
+    parser.add_argument("--days", type=int, default=1000,
+                        help="number of days of trading data for each stock")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed for the synthetic market")
+    parser.add_argument("--output", help="write the results to this file "
+                        "instead of standard output")
+    parser.add_argument("--compare", action="store_true",
+                        help="compare against the original code instead")
+    args = parser.parse_args()
+    if args.compare:
+        compare()
+        return
+    report = json.dumps(run_suite(args.stocks, args.days, args.seed), indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
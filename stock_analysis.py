@@ -6,6 +6,17 @@ analysis on the data.
     __email__ = xinyi.li4@uqconnect.edu.au
 """
 
+import io
+import mmap
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import chain, compress, count, islice, zip_longest
+from operator import gt, lt, methodcaller, mul, sub
+
 import stocks
 
 Loader = stocks.Loader
@@ -20,22 +31,36 @@ class LoadCSV(Loader):
     the data.
     """
 
-    def __init__(self, filename, stocks):
+    extension = "csv"
+
+    # Approximate number of characters read from the file at a time.
+    _CHUNK_SIZE = 1 << 20
+    # Largest number of bytes of a file parsed by one worker at a time when
+    # loading in parallel.
+    _RANGE_SIZE = 1 << 24
+
+    def __init__(self, filename, stocks, workers=1):
         """Inherited parameters from stocks.Loader.
         
         Parameters:
             filename (str): Name of the file from which to load data.
             stocks (StockCollection): Collection of existing stock market 
             data to which the new data will be added.
+            workers (int): Number of processes that parse the file, each
+            parsing ranges of lines. None is the number of processors, and
+            1, the default, parses the file in this process.
         """
+        self._workers = workers or os.cpu_count() or 1
         super().__init__(filename, stocks)
-        self._file_validate(filename)
-        
 
     def _process(self, file):
         """Processes and extracts data from .csv files and determines whether
         if the data is valid before adding the data to the appropriate 
         stock object.
+
+        The file is read in chunks of lines. Each chunk is split into columns
+        which are converted in bulk, and the rows are only added to the stocks,
+        grouped by stock code, once the whole file has been parsed.
        
         Parameters:
             file (TextIOWrapper): Object of filename opened.
@@ -46,35 +71,169 @@ class LoadCSV(Loader):
         Preconditions:
             file must be a .csv file with the valid formatting
         """
-        for data in file:
-            datalist = data.split(",")
-            if len(datalist) == 7 and len(datalist[0]) >= 3:
-                stock = self._stocks.get_stock(datalist[0])
-                try:
-                    int(datalist[1]) #check if date consists of integers
-                    stock.add_day_data(TradingData(str(datalist[1]),
-                                                 float(datalist[2]),
-                                                 float(datalist[3]),
-                                                 float(datalist[4]),
-                                                 float(datalist[5]),
-                                                 int(datalist[6])))
-
-                except ValueError:
-                    raise RuntimeError ('invalid data format.')
-            else:
-                raise RuntimeError ('the file must be a .csv file.')
+        if self._workers > 1:
+            ranges = self._ranges(file.name, self._workers)
+            if len(ranges) > 1:
+                self._process_ranges(file, ranges)
+                return
+        codes, columns, num_lines, error = self._parse_lines(file)
+        if error is not None:
+            self._rows += error[0] - 1
+            raise RuntimeError (error[1].format(error[0]))
+        self._rows += num_lines
+        self._stocks.add_columns(codes, columns)
+
+    def _process_ranges(self, file, ranges):
+        """Parses ranges of the file in worker processes and adds their data
+        to the stocks in file order.
+
+        Parameters:
+            file (TextIOWrapper): Object of filename opened.
+            ranges (list<tuple<int, int>>): Start and end byte positions of
+            each range.
+
+        Raises:
+            RuntimeError: If the data structure is invalid, reporting the
+            line number within the whole file.
+        """
+        with ProcessPoolExecutor(self._workers) as pool:
+            parsed = [pool.submit(_parse_csv_range, file.name, start, end)
+                      for start, end in ranges]
+            line_number = 1
+            try:
+                for future in parsed:
+                    loaded, num_lines, error = future.result()
+                    if error is not None:
+                        number = line_number + error[0] - 1
+                        self._rows = number - 1
+                        raise RuntimeError (error[1].format(number))
+                    self._stocks.merge(loaded)
+                    line_number += num_lines
+                    self._rows = line_number - 1
+            finally:
+                for future in parsed:
+                    future.cancel()
+        # The workers have read the whole file.
+        file.seek(0, os.SEEK_END)
+
+    @classmethod
+    def _ranges(cls, filename, workers):
+        """Splits a file into ranges of whole lines for the workers to parse.
+
+        Parameters:
+            filename (str): Name of the file.
+            workers (int): Number of workers that will parse the ranges.
+
+        Returns:
+            list<tuple<int, int>>: Start and end byte positions of each range,
+            in file order. Each range but the last ends just after a newline.
+        """
+        size = os.path.getsize(filename)
+        if not size:
+            return []
+        range_size = max(cls._CHUNK_SIZE,
+                         min(cls._RANGE_SIZE, size // workers + 1))
+        bounds = [0]
+        with open(filename, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                while bounds[-1] < size:
+                    newline = data.find(b"\n", bounds[-1] + range_size)
+                    bounds.append(size if newline < 0 else newline + 1)
+        return list(zip(bounds, bounds[1:]))
+
+    @classmethod
+    def _parse_lines(cls, file):
+        """Converts all of the lines of a file column by column.
+
+        Parameters:
+            file (TextIOBase): The lines to convert.
+
+        Returns:
+            tuple: The stock code of each row, the rows as TradingColumns, the
+            number of lines, and None or, if a line is invalid, the line number
+            and error message of the first invalid line. The message has a
+            {0} in place of the line number.
+        """
+        codes = []
+        columns = stocks.TradingColumns.empty()
+        line_number = 1
+        while True:
+            lines = file.readlines(cls._CHUNK_SIZE)
+            if not lines:
+                break
+            try:
+                cls._parse_chunk(lines, codes, columns)
+            except (ValueError, OverflowError):
+                offset, message = cls._find_row_error(lines)
+                return codes, columns, line_number - 1, (line_number + offset,
+                                                         message)
+            line_number += len(lines)
+        return codes, columns, line_number - 1, None
 
     @staticmethod
-    def _file_validate(filename):
-        """Validates whether if the file has the correct extension.
-        
+    def _parse_chunk(lines, codes, columns):
+        """Converts a chunk of lines column by column and appends them to
+        'codes' and 'columns'. Nothing is appended if any line is invalid.
+
+        Every line must have exactly seven fields, so the chunk is split into
+        fields in one step and each column is every seventh field.
+
+        Parameters:
+            lines (list<str>): The lines of the chunk.
+            codes (list<str>): Stock market code of each row parsed so far.
+            columns (TradingColumns): Trading data of each row parsed so far.
+
         Raises:
-            RuntimeError: If the filename does not have the correct extension
+            ValueError: If any line in the chunk is invalid.
         """
-        extension = filename.split(".")
-        if extension[-1] != "csv":
-            raise RuntimeError ('the file must be a .csv file.')
-        
+        if set(map(methodcaller("count", ","), lines)) != {6}:
+            raise ValueError()
+        fields = ",".join(lines).split(",")
+        chunk_codes = fields[0::7]
+        if min(map(len, chunk_codes)) < 3:
+            raise ValueError()
+        converted = (stocks.TradingColumns.ordinals(fields[1::7]),
+                     array("d", map(float, fields[2::7])),
+                     array("d", map(float, fields[3::7])),
+                     array("d", map(float, fields[4::7])),
+                     array("d", map(float, fields[5::7])),
+                     array("q", map(int, fields[6::7])))
+        codes.extend(chunk_codes)
+        for column, values in zip((columns.date, columns.open, columns.high,
+                                   columns.low, columns.close, columns.volume),
+                                  converted):
+            column.extend(values)
+
+    @staticmethod
+    def _find_row_error(lines):
+        """Finds the first invalid line in a chunk.
+
+        Parameters:
+            lines (list<str>): The lines of the chunk.
+
+        Returns:
+            tuple<int, str>: Position of the invalid line in the chunk and an
+            error message describing it, with a {0} in place of its line
+            number.
+        """
+        for offset, data in enumerate(lines):
+            datalist = data.split(",")
+            if len(datalist) != 7 or len(datalist[0]) < 3:
+                return offset, ('the file must be a .csv file, line {0} '
+                                'is invalid.')
+            try:
+                stocks.TradingColumns.ordinals([datalist[1]])
+                [float(value) for value in datalist[2:6]]
+                array("q", [int(datalist[6])])
+            except (ValueError, OverflowError):
+                return offset, 'invalid data format on line {0}.'
+        return 0, 'invalid data format.'
+
+    @staticmethod
+    def _matches(line):
+        """Returns whether 'line' looks like a line of a .csv file."""
+        return line.count(",") == 6
+
 
 class LoadTriplet(Loader):
     """Subclass of stocks.Loader, handles the processing and loading of .trp 
@@ -82,110 +241,106 @@ class LoadTriplet(Loader):
     from the data.
     """
 
-    def __init__(self, filename, stocks):
-        """Inherited parameters from stocks.Loader.
-        
-        Parameters:
-            filename (str): Name of the file from which to load data.
-            stocks (StockCollection): Collection of existing stock market data
-            
-                                      to which the new data will be added.
-        Raises:
-            RuntimeError: If the data structure is invalid.
+    extension = "trp"
 
-        Preconditions:
-            file must be a .trp file with the valid formatting
-        """
-        super().__init__(filename, stocks)
-        self._file_validate(filename)
-        
+    # Number of records converted and added to the stocks at a time.
+    _BATCH_SIZE = 10000
 
     def _process(self, file):
         """Processes and extracts data from .trp files and determines whether
         if the data is valid before adding the data to the appropriate 
         stock object. 
 
+        Each record is six consecutive code:field:value lines, holding the
+        date, open, high, low, close and volume in that order. The file is
+        read one record at a time, and records are converted to columns in
+        batches, so only a batch of the file's text is held in memory.
+
         Parameters:
             file (TextIOWrapper): Object of filename opened.
 
         Raises:
             RuntimeError: If the data structure is invalid.
         """
-        datalist = []
-        datalist_split = []
-        stocklist = []
-        codelist = []
-        codelist_split = []
-        valuelist = []
-
-        for data in file:
-            datalist.append(data)
-
-        if len(datalist) % 6 == 0:
-
-            for x in range(0, len(datalist), 6):
-                datalist_split.append(datalist[x:x+6])
-
-            for data in datalist_split:
-                for string in data:
-                    x = string.split(":")
-                    try:
-                        valuelist.append(x[2])
-                        codelist.append(x[0])
-                    except IndexError:
-                        raise RuntimeError ('invalid data format.')
-                            
-            for code in codelist:
-                if len(code) < 3:
-                    raise RuntimeError ('invalid data format.')
-
-            for x in range(0, len(valuelist), 6):
-                stocklist.append(valuelist[x:x+6])
-
-            for x in range(0, len(codelist), 6):
-                codelist_split.append(codelist[x:x+6])
-
-            c = 0
-            for x in codelist_split:
-                stocklist[c].append(x[0])
-                c += 1
-
-            for data in stocklist:
-                stock = self._stocks.get_stock(data[6])
-                try:
-                    int(data[0]) #check if date consists of integers
-                    stock.add_day_data(TradingData(str(data[0]),
-                                                 float(data[1]),
-                                                 float(data[2]),
-                                                 float(data[3]),
-                                                 float(data[4]),
-                                                 int(data[5])))
-                except ValueError:
-                    raise RuntimeError ('invalid data format.')
-        else:
-            raise RuntimeError ('invalid data format.')
+        codes = []
+        values = []
+        line_number = 1
+        lines = iter(file)
+        for record in zip_longest(*[lines] * 6):
+            if record[-1] is None:
+                raise RuntimeError ('invalid data format, the record starting '
+                                    'on line {0} is incomplete.'.format(
+                                        line_number + 6 * len(codes)))
+            for offset, data in enumerate(record):
+                triplet = data.split(":")
+                if len(triplet) < 3 or len(triplet[0]) < 3:
+                    raise RuntimeError ('invalid data format on line {0}.'
+                                        .format(line_number + 6 * len(codes)
+                                                + offset))
+                values.append(triplet[2])
+            codes.append(record[0].split(":")[0])
 
-    @staticmethod
-    def _file_validate(filename):
-        """Validates whether if the file has the correct extension.
+            if len(codes) == self._BATCH_SIZE:
+                self._add_records(codes, values, line_number)
+                line_number += 6 * len(codes)
+                codes = []
+                values = []
+        self._add_records(codes, values, line_number)
+
+    def _add_records(self, codes, values, line_number):
+        """Converts a batch of records column by column and adds them to the
+        appropriate stock objects.
+
+        Parameters:
+            codes (list<str>): Stock market code of each record.
+            values (list<str>): The six values of each record, in order.
+            line_number (int): Line number in the file of the first record.
 
         Raises:
-            RuntimeError: If the filename does not have the correct extension
+            RuntimeError: If any value has an invalid format.
         """
-        extension = filename.split(".")
-        if extension[-1] != "trp":
-            raise RuntimeError ('the file must be a .trp file')
+        try:
+            columns = stocks.TradingColumns(
+                stocks.TradingColumns.ordinals(values[0::6]),
+                array("d", map(float, values[1::6])),
+                array("d", map(float, values[2::6])),
+                array("d", map(float, values[3::6])),
+                array("d", map(float, values[4::6])),
+                array("q", map(int, values[5::6])))
+        except (ValueError, OverflowError):
+            for number, value in enumerate(values, line_number):
+                field = (number - line_number) % 6
+                try:
+                    if field == 0:
+                        stocks.TradingColumns.ordinals([value])
+                    elif field == 5:
+                        array("q", [int(value)])
+                    else:
+                        float(value)
+                except (ValueError, OverflowError):
+                    raise RuntimeError ('invalid data format on line {0}.'
+                                        .format(number))
+            raise RuntimeError ('invalid data format.')
+        self._rows += len(codes)
+        self._stocks.add_columns(codes, columns)
+
+    @staticmethod
+    def _matches(line):
+        """Returns whether 'line' looks like a line of a .trp file."""
+        return line.count(":") >= 2
 
 
 class HighLow(Analyser):
-    """Subclass of Analyser. Provides access to high low analysis of stock data
+    """Subclass of Analyser. Provides access to high low analysis of stock data.
+    Only the highest and lowest trades seen so far are kept.
     """
 
     def __init__(self):
-        """Initialise lists which will contain data for processing.
+        """Initialise the variables which will contain the highest and lowest
+        trades.
         """
-        self._total_high = []
-        self._total_low = []
+        self._high = None
+        self._low = None
 
     def process(self, day):
         """Retrieves and processes the data to analyse stock's highest and 
@@ -194,15 +349,37 @@ class HighLow(Analyser):
         Parameters:
             day (TradingData): Trading data for one stock on one day.
         """
-        self._total_high.append(day.get_high())
-        self._total_high.sort()
-        self._total_low.append(day.get_low())
-        self._total_low.sort()
+        high = day.get_high()
+        low = day.get_low()
+        if self._high is None or high > self._high:
+            self._high = high
+        if self._low is None or low < self._low:
+            self._low = low
+
+    def process_batch(self, columns):
+        """Processes a run of days to analyse stock's highest and lowest 
+        trades.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+        """
+        if not len(columns):
+            return
+        high = max(columns.high)
+        low = min(columns.low)
+        if self._high is None or high > self._high:
+            self._high = high
+        if self._low is None or low < self._low:
+            self._low = low
 
     def reset(self):
         """Reset the analysis process in order to perform a new analysis."""
-        self._total_high = []
-        self._total_low = []
+        self._high = None
+        self._low = None
+
+    def get_parameters(self):
+        """Returns the parameters of the analysis, of which there are none."""
+        return ()
 
     def result(self):
         """Returns the result of the high low analysis and checks for 
@@ -212,82 +389,408 @@ class HighLow(Analyser):
              tuple: Containing the highest trade and lowest trade of the stock.
              
         Raises:
-            ValueError: If an IndexError occurs while returning the results.
+            ValueError: If no data has been processed.
         """
-        try:
-            return self._total_high[-1], self._total_low[0]
-        except IndexError:
+        if self._high is None:
             raise ValueError ('this stock has no high or low.')
+        return self._high, self._low
 
 
-class MovingAverage(Analyser):
-    """Subclass of Analyser. Provides access to moving average analysis of 
-       stock data
+class RollingHighLow(Analyser):
+    """Subclass of Analyser. Provides access to the highest and lowest trades
+    of stock data over the last num_days days.
+
+    Candidates for the high and low are kept in monotonic deques, so each day
+    is added and removed at most once and a whole history is processed in
+    linear time.
     """
 
     def __init__(self, num_days):
-        """Initialise the variables and list which will contain data 
-        for processing.
-        
+        """Initialise the deques which will contain data for processing.
+
         Parameters
             num_days(int): The number of days over to process
-            
-        Preconditions:
-            num_days must be a integer greater than 0
+
+        Raises:
+            ValueError: If the parameter num_days is less or equal to 0
         """
+        if num_days <= 0 or type(num_days) == float:
+            raise ValueError ('please enter valid day/s.')
         self._num_days = num_days
-        self._closing_total = 0
-        self._data = []
+        self._day = 0
+        # (day number, value) pairs. Highs are decreasing and lows increasing
+        # from front to back, so the front of each deque is the result.
+        self._highs = deque()
+        self._lows = deque()
 
     def process(self, day):
-        """Retrieves and processes the data to analyse stock's moving average.
+        """Retrieves and processes the data to analyse stock's highest and 
+        lowest trades over the last num_days days.
 
         Parameters:
             day (TradingData): Trading data for one stock on one day.
+        """
+        self._add(day.get_high(), day.get_low())
+
+    def process_batch(self, columns):
+        """Processes a run of days to analyse stock's highest and lowest 
+        trades over the last num_days days. Only the last num_days days of the
+        run can affect the result.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+        """
+        if len(columns) >= self._num_days:
+            self._day += len(columns) - self._num_days
+            self._highs.clear()
+            self._lows.clear()
+        for high, low in zip(columns.high[-self._num_days:],
+                             columns.low[-self._num_days:]):
+            self._add(high, low)
+
+    def _add(self, high, low):
+        """Adds one day's high and low, dropping candidates that can no longer
+        be the highest or lowest trade in the window.
+        """
+        day = self._day
+        self._day += 1
+        expired = day - self._num_days
+
+        highs = self._highs
+        while highs and highs[-1][1] <= high:
+            highs.pop()
+        highs.append((day, high))
+        if highs[0][0] <= expired:
+            highs.popleft()
+
+        lows = self._lows
+        while lows and lows[-1][1] >= low:
+            lows.pop()
+        lows.append((day, low))
+        if lows[0][0] <= expired:
+            lows.popleft()
+
+    def reset(self):
+        """Reset the analysis process in order to perform a new analysis."""
+        self._day = 0
+        self._highs = deque()
+        self._lows = deque()
+
+    def get_parameters(self):
+        """Returns the parameters of the analysis, the number of days."""
+        return (self._num_days,)
+
+    def result(self):
+        """Returns the result of the rolling high low analysis.
+
+        Returns:
+             tuple: Containing the highest trade and lowest trade of the stock
+             over the last num_days days.
+
+        Raises:
+            ValueError: If no data has been processed.
+        """
+        if not self._highs:
+            raise ValueError ('this stock has no high or low.')
+        return self._highs[0][1], self._lows[0][1]
+
+
+class MovingAverage(Analyser):
+    """Subclass of Analyser. Provides access to moving average analysis of 
+       stock data.
+
+    Closing values of the last num_days days are kept in a ring buffer and
+    the total of the window is updated as each day is added, so each day
+    costs constant time. The total is recalculated from the buffer each time
+    the buffer wraps around, which keeps rounding errors from accumulating.
+    The final result is calculated from the buffer itself, so it does not
+    depend on how the days were split between calls.
+
+    Subclasses weight the window differently by overriding _clear, _update,
+    _resync, _current and _final.
+    """
+
+    # True if only the last num_days days can affect the average.
+    _windowed = True
+
+    def __init__(self, num_days, series=False):
+        """Initialise the variables and ring buffer which will contain data 
+        for processing.
         
+        Parameters
+            num_days(int): The number of days over to process
+            series(bool): If True, the result is the average for every day
+            from the num_days'th day onwards, rather than only the last day.
+
         Raises:
             ValueError: If the parameter num_days is less or equal to 0
         """
-        self._data.append(day.get_close())
-        
-        if self._num_days <= 0 or type(self._num_days) == float:
+        if num_days <= 0 or type(num_days) == float:
             raise ValueError ('please enter valid day/s.')
+        self._num_days = num_days
+        self._series = series
+        self.reset()
+
+    def process(self, day):
+        """Retrieves and processes the data to analyse stock's moving average.
+
+        Parameters:
+            day (TradingData): Trading data for one stock on one day.
+        """
+        self._add(day.get_close())
 
-        if len(self._data) >= self._num_days:
-            while len(self._data) > self._num_days:
-                del self._data[0]
-            self._closing_total = sum(self._data)
+    def process_batch(self, columns):
+        """Processes a run of days to analyse stock's moving average. Unless
+        the whole series is wanted, only the last num_days closing values can
+        affect a windowed average.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+        """
+        closes = columns.close
+        if (self._windowed and not self._series
+                and len(closes) >= self._num_days):
+            self._clear()
+            closes = closes[-self._num_days:]
+        for close in closes:
+            self._add(close)
+
+    def _add(self, close):
+        """Adds one day's closing value to the window and updates the
+        average.
+        """
+        position = self._position
+        if self._filled < self._num_days:
+            self._filled += 1
+            oldest = None
+        else:
+            oldest = self._window[position]
+        self._window[position] = close
+        self._update(close, oldest)
+
+        position += 1
+        if position == self._num_days:
+            # The buffer now holds the window in date order.
+            position = 0
+            self._resync()
+        self._position = position
+
+        if self._series and self._filled == self._num_days:
+            self._averages.append(self._current())
+
+    def _clear(self):
+        """Empties the window, keeping any averages already recorded."""
+        self._window = [0.0] * self._num_days
+        self._position = 0
+        self._filled = 0
+        self._closing_total = 0
+
+    def _update(self, close, oldest):
+        """Updates the window total for a new closing value.
+
+        Parameters:
+            close (float): The closing value added to the window.
+            oldest (float): The closing value leaving the window, or None if
+            the window is not yet full.
+        """
+        if oldest is None:
+            self._closing_total += close
+        else:
+            self._closing_total += close - oldest
+
+    def _resync(self):
+        """Recalculates the window total from the buffer."""
+        self._closing_total = sum(self._window)
+
+    def _current(self):
+        """(float) The average of the full window."""
+        return self._closing_total / self._num_days
+
+    def _final(self):
+        """(float) The average of the full window, calculated from the
+        buffer.
+        """
+        return sum(self._in_date_order()) / self._num_days
+
+    def _in_date_order(self):
+        """(iterator<float>) The closing values in the full window, oldest
+        first.
+        """
+        return chain(self._window[self._position:],
+                     self._window[:self._position])
 
     def reset(self):
         """Reset the analysis process in order to perform a new analysis."""
-        self._closing_total = 0
-        self._data = []
+        self._clear()
+        self._averages = []
+
+    def get_parameters(self):
+        """Returns the parameters of the analysis, the number of days and
+        whether the result is a series.
+        """
+        return (self._num_days, self._series)
+
+    def get_state(self):
+        """Returns a copy of the analysis process's state.
+
+        Returns:
+            dict: The analyser's attributes, with the buffer and averages
+            copied.
+        """
+        state = self.__dict__.copy()
+        state["_window"] = list(self._window)
+        state["_averages"] = list(self._averages)
+        return state
+
+    def set_state(self, state):
+        """Resumes the analysis process from a state returned by get_state.
+
+        Parameters:
+            state (dict): The state of an analysis by the same type of
+            analyser.
+        """
+        self.__dict__.update(state)
+        self._window = list(state["_window"])
+        self._averages = list(state["_averages"])
 
     def result(self):
         """Returns the result of the moving average analysis
         
         Returns:
-            int: Moving average of the stock across the specified number of 
-            days.
+            float: Moving average of the stock across the specified number of 
+            days, or 0 if fewer than num_days days have been processed.
+            list<float>: In series mode, the moving average for every day from
+            the num_days'th day onwards, in date order.
         """
-        return self._closing_total / self._num_days
+        if self._series:
+            return list(self._averages)
+        if self._filled < self._num_days:
+            return 0.0
+        return self._final()
+
+
+class WeightedMovingAverage(MovingAverage):
+    """Subclass of MovingAverage. Provides access to linearly weighted moving
+       average analysis of stock data, where the most recent day has weight
+       num_days and the oldest day in the window has weight 1.
+    """
+
+    def __init__(self, num_days, series=False):
+        """Initialise the variables and ring buffer which will contain data 
+        for processing.
+
+        Parameters
+            num_days(int): The number of days over to process
+            series(bool): If True, the result is the average for every day
+            from the num_days'th day onwards, rather than only the last day.
+
+        Raises:
+            ValueError: If the parameter num_days is less or equal to 0
+        """
+        super().__init__(num_days, series)
+        self._total_weight = num_days * (num_days + 1) / 2
+
+    def _clear(self):
+        """Empties the window, keeping any averages already recorded."""
+        super()._clear()
+        self._weighted_total = 0
+
+    def _update(self, close, oldest):
+        """Updates the window totals for a new closing value. Adding a day
+        lowers the weight of every other day in the window by one.
+        """
+        if oldest is None:
+            self._weighted_total += self._filled * close
+        else:
+            self._weighted_total += self._num_days * close - self._closing_total
+        super()._update(close, oldest)
+
+    def _resync(self):
+        """Recalculates the window totals from the buffer."""
+        super()._resync()
+        self._weighted_total = sum(map(mul, range(1, self._num_days + 1),
+                                       self._window))
+
+    def _current(self):
+        """(float) The weighted average of the full window."""
+        return self._weighted_total / self._total_weight
+
+    def _final(self):
+        """(float) The weighted average of the full window, calculated from
+        the buffer.
+        """
+        return (sum(map(mul, count(1), self._in_date_order()))
+                / self._total_weight)
+
+
+class ExponentialMovingAverage(MovingAverage):
+    """Subclass of MovingAverage. Provides access to exponential moving
+       average analysis of stock data, using a smoothing factor of
+       2 / (num_days + 1). The average starts as the simple average of the
+       first num_days days.
+    """
+
+    # Every day processed contributes to an exponential average.
+    _windowed = False
+
+    def __init__(self, num_days, series=False):
+        """Initialise the variables and ring buffer which will contain data 
+        for processing.
+
+        Parameters
+            num_days(int): The number of days over to process
+            series(bool): If True, the result is the average for every day
+            from the num_days'th day onwards, rather than only the last day.
+
+        Raises:
+            ValueError: If the parameter num_days is less or equal to 0
+        """
+        super().__init__(num_days, series)
+        self._alpha = 2 / (num_days + 1)
+
+    def _clear(self):
+        """Empties the window, keeping any averages already recorded."""
+        super()._clear()
+        self._exponential = None
+
+    def _update(self, close, oldest):
+        """Updates the exponential average for a new closing value."""
+        if self._exponential is None:
+            super()._update(close, oldest)
+            if self._filled == self._num_days:
+                self._exponential = self._closing_total / self._num_days
+        else:
+            self._exponential += self._alpha * (close - self._exponential)
+
+    def _resync(self):
+        """The exponential average does not depend on the buffer."""
+
+    def _current(self):
+        """(float) The exponential average."""
+        return self._exponential
+
+    def _final(self):
+        """(float) The exponential average."""
+        return self._exponential
 
 
 class GapUp(Analyser):
     """Subclass of Analyser. Provides access to gap up analysis of 
        stock data.
+
+    Only the previous day's closing value and the latest gap up day are
+    kept, so memory use does not grow with the number of days processed.
     """
     def __init__(self, delta):
-        """Initialise the variables and lists which will contain data 
-        for processing.
+        """Initialise the variables which will contain data for processing.
 
         Parameters
             delta(int): Determine whether if the price difference is significant
             or not.
         """
         self._delta = delta
-        self._opening = []
-        self._closing = []
+        # Closing value of the last day processed, or None before any day.
+        self._previous_close = None
         self._date = 0
 
     def process(self, day):
@@ -298,26 +801,83 @@ class GapUp(Analyser):
             day (TradingData): Trading data for one stock on one day.
 
         Raises:
-            ValueError: If the parameter num_days is 0
+            ValueError: If the parameter delta is not a number
         """
-        self._opening.append(day.get_open())
-        self._closing.append(day.get_close())
+        previous_close = self._previous_close
+        self._previous_close = day.get_close()
 
         try:
-            if len(self._closing) > 1:
-                if self._opening[-1] - self._closing[-2] > self._delta:
+            if previous_close is not None:
+                if day.get_open() - previous_close > self._delta:
                     self._date = day
             else:
                 self._date = None
         except TypeError:
             raise ValueError ('please enter a valid delta value.')
 
+    def process_batch(self, columns):
+        """Processes a run of days to determine the stock's latest gap up date
+        according to the delta value.
+
+        Each opening value is compared with the previous day's closing value,
+        which for the first day of the run is the last closing value seen.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+
+        Raises:
+            ValueError: If the parameter delta is not a number
+        """
+        if not len(columns):
+            return
+
+        if self._previous_close is not None:
+            previous_closes = chain((self._previous_close,), columns.close)
+            openings = columns.open
+            first = 0
+        else:
+            # The first day ever processed has no previous close.
+            previous_closes = columns.close
+            openings = islice(columns.open, 1, None)
+            first = 1
+            self._date = None
+        self._previous_close = columns.close[-1]
+
+        gaps = map(sub, openings, previous_closes)
+        try:
+            gap_days = list(compress(count(first),
+                                     map(partial(lt, self._delta), gaps)))
+        except TypeError:
+            raise ValueError ('please enter a valid delta value.')
+        if gap_days:
+            self._date = columns.day(gap_days[-1])
+
     def reset(self):
         """Reset the analysis process in order to perform a new analysis."""
-        self._opening = []
-        self._closing = []
+        self._previous_close = None
         self._date = 0
 
+    def get_parameters(self):
+        """Returns the parameters of the analysis, the delta."""
+        return (self._delta,)
+
+    def get_state(self):
+        """Returns a copy of the analysis process's state.
+
+        Returns:
+            dict: The analyser's attributes.
+        """
+        return self.__dict__.copy()
+
+    def set_state(self, state):
+        """Resumes the analysis process from a state returned by get_state.
+
+        Parameters:
+            state (dict): The state of an analysis by the same type of
+            analyser.
+        """
+        self.__dict__.update(state)
+
     def result(self):
         """Returns the result of the gap up analysis.
         
@@ -328,28 +888,143 @@ class GapUp(Analyser):
         return self._date
 
 
+class GapScreener(object):
+    """Finds every gap up and gap down across a collection of stocks.
+
+    A day gaps up when its opening value is more than delta above the
+    previous day's closing value, and gaps down when it is more than delta
+    below it. The delta is either an amount or a percentage of the previous
+    closing value.
+
+    Each stock's opening values are compared with its closing values shifted
+    by one day, a column at a time, and trading data is only created for the
+    days that gap.
+    """
+
+    def __init__(self, delta, percentage=False):
+        """
+        Parameters:
+            delta (float): Smallest difference between a day's opening value
+            and the previous closing value that is not a gap.
+            percentage (bool): If True, delta is a percentage of the previous
+            closing value rather than an amount.
+
+        Raises:
+            ValueError: If delta is not a number or is negative.
+        """
+        if type(delta) not in (int, float) or delta < 0:
+            raise ValueError ('please enter a valid delta value.')
+        self._delta = delta
+        self._percentage = percentage
+
+    def screen(self, all_stocks, start=None, end=None, codes=None):
+        """Finds the gaps on each day from start to end.
+
+        A gap on the start date is found by comparing it with the day before,
+        if there is one.
+
+        Parameters:
+            all_stocks (StockCollection): The stocks to screen.
+            start (str): If given, the first yyyymmdd date to screen.
+            end (str): If given, the last yyyymmdd date to screen.
+            codes (list<str>): If given, only these stocks are screened.
+            Codes that are not in the collection are ignored.
+
+        Returns:
+            list<tuple>: A (code, direction, gap, day) tuple for each gap, in
+            order of stock and then date. The direction is "up" or "down",
+            the gap is the opening value less the previous closing value, as
+            an amount or a percentage, and day is the TradingData of the day.
+        """
+        first_date = (None if start is None
+                      else stocks.TradingColumns.ordinals([start])[0])
+        last_date = (None if end is None
+                     else stocks.TradingColumns.ordinals([end])[0])
+        if codes is None:
+            codes = all_stocks.get_codes()
+        else:
+            known = set(all_stocks.get_codes())
+            codes = [code for code in codes if code in known]
+        events = []
+        for code in codes:
+            columns = all_stocks.get_stock(code).columns()
+            first = (1 if first_date is None
+                     else max(1, bisect_left(columns.date, first_date)))
+            last = (len(columns) if last_date is None
+                    else bisect_right(columns.date, last_date))
+            if first < last:
+                self._screen_stock(code, columns, first, last, events)
+        return events
+
+    def _screen_stock(self, code, columns, first, last, events):
+        """Appends the gaps on the days from first up to last of one stock
+        to events.
+
+        Parameters:
+            code (str): The stock's code.
+            columns (TradingColumns): The stock's trading data.
+            first (int): Index of the first day to screen, at least 1.
+            last (int): One past the index of the last day to screen.
+            events (list<tuple>): The gaps found so far.
+        """
+        previous_closes = columns.close[first - 1:last - 1]
+        gaps = list(map(sub, columns.open[first:last], previous_closes))
+        if self._percentage:
+            # A previous closing value of 0 has no percentage change, so it
+            # is never a gap.
+            gaps = [100.0 * gap / close if close else 0.0
+                    for gap, close in zip(gaps, previous_closes)]
+        ups = compress(count(first), map(partial(lt, self._delta), gaps))
+        downs = compress(count(first), map(partial(gt, -self._delta), gaps))
+        for index in sorted(chain(ups, downs)):
+            gap = gaps[index - first]
+            events.append((code, "up" if gap > 0 else "down", gap,
+                           columns.day(index)))
+
+
+def _parse_csv_range(filename, start, end):
+    """Parses a range of whole lines of a .csv file, for use by a worker
+    process.
+
+    Parameters:
+        filename (str): Name of the file.
+        start (int): Byte position of the first line of the range.
+        end (int): Byte position just after the last line of the range.
+
+    Returns:
+        tuple: The range's data as a StockCollection, the number of lines in
+        the range, and None or the line number within the range and error
+        message of the first invalid line, as from LoadCSV._parse_lines.
+    """
+    with open(filename, "rb") as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            text = data[start:end].decode()
+    codes, columns, num_lines, error = LoadCSV._parse_lines(
+        io.StringIO(text, newline=None))
+    loaded = stocks.StockCollection()
+    if error is None:
+        loaded.add_columns(codes, columns)
+    return loaded, num_lines, error
+
+
 def example_usage () :
     all_stocks = stocks.StockCollection()
-    LoadCSV("data_files/march1.csv", all_stocks)
-    LoadCSV("data_files/march2.csv", all_stocks)
-    LoadCSV("data_files/march3.csv", all_stocks)
-    LoadCSV("data_files/march4.csv", all_stocks)
-    LoadCSV("data_files/march5.csv", all_stocks)
-    LoadTriplet("data_files/feb1.trp", all_stocks)
-    LoadTriplet("data_files/feb2.trp", all_stocks)
-    LoadTriplet("data_files/feb3.trp", all_stocks)
-    LoadTriplet("data_files/feb4.trp", all_stocks)
-    volume = stocks.AverageVolume()
+    all_stocks.load_many(["data_files/march1.csv",
+                          "data_files/march2.csv",
+                          "data_files/march3.csv",
+                          "data_files/march4.csv",
+                          "data_files/march5.csv",
+                          "data_files/feb1.trp",
+                          "data_files/feb2.trp",
+                          "data_files/feb3.trp",
+                          "data_files/feb4.trp"])
     stock = all_stocks.get_stock("ADV")
-    stock.analyse(volume)
-    print("Average Volume of ADV is", volume.result())
-    high_low = HighLow()
-    stock.analyse(high_low)
-    print("Highest & Lowest trading price of ADV is", high_low.result())
-    moving_average = MovingAverage(10)
-    stock.analyse(moving_average)
+    volume, high_low, moving_average = stock.analyse_many(
+        [stocks.AverageVolume(), HighLow(), MovingAverage(10)])
+    print("Average Volume of ADV is", volume)
+    print("Highest & Lowest trading price of ADV is", high_low)
     print("Moving average of ADV over last 10 days is {0:.2f}"
-          .format(moving_average.result()))
+          .format(moving_average))
     gap_up = GapUp(0.011)
     stock = all_stocks.get_stock("YOW")
     stock.analyse(gap_up)
@@ -0,0 +1,334 @@
+"""Analysis across all of the stocks in a collection at once.
+
+    CrossSection: Closing values of many stocks aligned on one date axis, with
+    return correlations between stocks and rankings of analysis results.
+"""
+
+import heapq
+import math
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import mul
+
+import stocks
+
+NAN = float("nan")
+# Fraction of a stock's total variation below which its variation over the
+# dates shared with another stock is taken to be zero.
+_EPSILON = 1e-12
+
+
+class CrossSection(object):
+    """The closing values of a set of stocks, aligned on a common axis of
+    every date on which any of the stocks traded. A stock's value is NaN on
+    the dates it did not trade.
+
+    Returns are the change in closing value from one date on the axis to the
+    next, so a stock has no return on a date it did not trade or on the date
+    after.
+    """
+
+    def __init__(self, all_stocks, codes=None, start=None, end=None):
+        """
+        Parameters:
+            all_stocks (StockCollection): The stocks to analyse.
+            codes (list<str>): If given, only these stocks are included.
+            Codes that are not in the collection are ignored.
+            start (str): If given, only days from this yyyymmdd date onwards
+            are included.
+            end (str): If given, only days up to and including this yyyymmdd
+            date are included.
+        """
+        known = all_stocks.get_codes()
+        if codes is not None:
+            known = set(known)
+            known = [code for code in codes if code in known]
+        self._stocks = all_stocks
+        self._codes = known
+        self._start = start
+        self._end = end
+        self._positions = {code: position
+                           for position, code in enumerate(self._codes)}
+        self._dates, self._closes = self._align(
+            [all_stocks.get_stock(code).columns(start, end)
+             for code in self._codes])
+
+    @staticmethod
+    def _align(all_columns):
+        """Aligns each stock's closing values on the dates of all stocks.
+
+        A stock whose dates are a run of consecutive dates on the axis, as
+        most are, is copied into place in one step.
+
+        Parameters:
+            all_columns (list<TradingColumns>): Trading data of each stock.
+
+        Returns:
+            tuple: The date axis as a list of day ordinals, and an array of
+            closing values on those dates for each stock.
+        """
+        dates = sorted(set().union(*(columns.date
+                                     for columns in all_columns)))
+        positions = {date: position for position, date in enumerate(dates)}
+        all_closes = []
+        for columns in all_columns:
+            closes = array("d", [NAN]) * len(dates)
+            if len(columns):
+                first = positions[columns.date[0]]
+                if positions[columns.date[-1]] - first == len(columns) - 1:
+                    closes[first:first + len(columns)] = array(
+                        "d", columns.close)
+                else:
+                    for position, close in zip(
+                            map(positions.__getitem__, columns.date),
+                            columns.close):
+                        closes[position] = close
+            all_closes.append(closes)
+        return dates, all_closes
+
+    def get_codes(self):
+        """Returns the codes of the stocks, in the order used throughout."""
+        return list(self._codes)
+
+    def get_dates(self):
+        """Returns the date axis, as dates in yyyymmdd format."""
+        return list(map(stocks._date_string, self._dates))
+
+    def get_closes(self, code):
+        """Returns a stock's closing values on the date axis.
+
+        Parameters:
+            code (str): The stock's code.
+
+        Returns:
+            array<float>: The closing value on each date, or NaN.
+        """
+        return array("d", self._closes[self._positions[code]])
+
+    def correlations(self, block_size=256, workers=None):
+        """Computes the correlation between the returns of every pair of
+        stocks, one block of the matrix at a time.
+
+        Each correlation uses the dates on which both stocks have a return.
+        It is NaN if there are fewer than two such dates or either stock's
+        returns do not vary over them. The matrix is symmetric, so only the
+        blocks on and above the diagonal are produced.
+
+        Blocks are independent, so they are computed in parallel by worker
+        processes, each given the closing values of the block's stocks. Only
+        a few blocks per worker are in flight at once, and the returns of a
+        block's stocks are only held while it is computed, so memory does
+        not grow with the number of blocks.
+
+        Parameters:
+            block_size (int): Number of stocks in each side of a block.
+            workers (int): Maximum number of processes used. Defaults to the
+            number of processors. If 1, blocks are computed in this process.
+
+        Returns:
+            iterator<tuple>: The first row and first column of each block, in
+            the order of get_codes, and the block as a list of arrays, one
+            per row.
+
+        Raises:
+            ValueError: If block_size is less than 1.
+        """
+        if block_size < 1:
+            raise ValueError('block_size must be at least 1.')
+        workers = workers or os.cpu_count() or 1
+        count = len(self._codes)
+        blocks = [(row, column) for row in range(0, count, block_size)
+                  for column in range(row, count, block_size)]
+        if workers == 1 or len(blocks) < 2:
+            return ((row, column, _correlation_block(
+                        *self._block_closes(row, column, block_size)))
+                    for row, column in blocks)
+        return self._parallel_correlations(blocks, block_size, workers)
+
+    def _parallel_correlations(self, blocks, block_size, workers):
+        """Computes blocks of correlations in worker processes, yielding them
+        in order, with at most two blocks per worker in flight.
+        """
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            blocks = iter(blocks)
+            try:
+                for row, column in blocks:
+                    pending.append((row, column, pool.submit(
+                        _correlation_block,
+                        *self._block_closes(row, column, block_size))))
+                    if len(pending) < 2 * workers:
+                        continue
+                    row, column, block = pending.popleft()
+                    yield row, column, block.result()
+                while pending:
+                    row, column, block = pending.popleft()
+                    yield row, column, block.result()
+            finally:
+                for row, column, block in pending:
+                    block.cancel()
+
+    def _block_closes(self, row, column, block_size):
+        """Returns the closing values of the stocks in the rows and columns
+        of a block. The columns are None for a block on the diagonal, whose
+        rows and columns are the same stocks.
+        """
+        rows = self._closes[row:row + block_size]
+        if row == column:
+            return rows, None
+        return rows, self._closes[column:column + block_size]
+
+    def correlation_matrix(self, block_size=256, workers=None):
+        """Returns the whole correlation matrix, assembled from the blocks of
+        'correlations'.
+
+        Returns:
+            list<array<float>>: One row of correlations for each stock, in the
+            order of get_codes.
+        """
+        count = len(self._codes)
+        matrix = [array("d", [NAN]) * count for code in self._codes]
+        for row, column, block in self.correlations(block_size, workers):
+            for offset, values in enumerate(block):
+                matrix[row + offset][column:column + len(values)] = values
+                for index, value in enumerate(values, column):
+                    matrix[index][row + offset] = value
+        return matrix
+
+    def top(self, analyser_factory, num_stocks, key=None, workers=1):
+        """Returns the stocks with the largest results of an analysis.
+
+        Parameters:
+            analyser_factory (callable): Returns a new Analyser when called
+            with no arguments, as for StockCollection.analyse_all.
+            num_stocks (int): Number of stocks to return.
+            key (callable): If given, ranks results by key(result) rather
+            than the results themselves.
+            workers (int): Number of processes used to analyse the stocks.
+
+        Returns:
+            list<tuple<str, object>>: The code and result of each stock,
+            largest first. Stocks without trading data are left out.
+        """
+        return self._rank(heapq.nlargest, analyser_factory, num_stocks, key,
+                          workers)
+
+    def bottom(self, analyser_factory, num_stocks, key=None, workers=1):
+        """Returns the stocks with the smallest results of an analysis.
+
+        The parameters are those of 'top'.
+
+        Returns:
+            list<tuple<str, object>>: The code and result of each stock,
+            smallest first. Stocks without trading data are left out.
+        """
+        return self._rank(heapq.nsmallest, analyser_factory, num_stocks, key,
+                          workers)
+
+    def _rank(self, select, analyser_factory, num_stocks, key, workers):
+        """Analyses the stocks over the cross section's dates and selects
+        num_stocks of the results with select, heapq.nlargest or nsmallest.
+        """
+        results = self._stocks.analyse_all(analyser_factory, workers,
+                                           self._codes, self._start,
+                                           self._end)
+        if key is None:
+            rank_key = _result
+        else:
+            rank_key = lambda item: key(item[1])
+        return select(num_stocks, results.items(), key=rank_key)
+
+
+class _ReturnSeries(object):
+    """The returns of one stock, prepared so that its correlation with
+    another stock needs a single pass over the returns.
+
+    Returns are held less their mean, with 0.0 where there is no return, so
+    the products of two stocks' returns are zero wherever either has none.
+    The sums over the dates both have a return are then the stock's own sums
+    less its values on the other stock's missing dates, which are few for
+    most stocks.
+    """
+
+    def __init__(self, closes):
+        """
+        Parameters:
+            closes (array<float>): Closing values on the date axis, or NaN.
+        """
+        returns = list(map(_return, closes[:-1], closes[1:]))
+        self.missing = frozenset(index for index, value in enumerate(returns)
+                                 if value != value)
+        count = len(returns) - len(self.missing)
+        mean = math.fsum(value for value in returns if value == value) / count \
+            if count else 0.0
+        self.values = array("d", [value - mean if value == value else 0.0
+                                  for value in returns])
+        self.total = math.fsum(self.values)
+        self.squares = math.fsum(map(mul, self.values, self.values))
+
+    def correlation(self, other):
+        """Returns the correlation between these returns and other's, over
+        the dates on which both have a return, or NaN.
+        """
+        count = len(self.values) - len(self.missing | other.missing)
+        if count < 2:
+            return NAN
+        sum_x, squares_x = self._sums_without(other.missing)
+        sum_y, squares_y = other._sums_without(self.missing)
+        variance_x = squares_x - sum_x * sum_x / count
+        variance_y = squares_y - sum_y * sum_y / count
+        # Differences far smaller than the stock's own variation are
+        # rounding error, left when its returns on the shared dates are
+        # constant.
+        if (variance_x <= _EPSILON * self.squares
+                or variance_y <= _EPSILON * other.squares):
+            return NAN
+        covariance = sum(map(mul, self.values, other.values)) \
+            - sum_x * sum_y / count
+        return covariance / math.sqrt(variance_x * variance_y)
+
+    def _sums_without(self, missing):
+        """Returns the sum of the values and of their squares, leaving out
+        the values at the 'missing' positions.
+        """
+        if not missing:
+            return self.total, self.squares
+        left_out = list(map(self.values.__getitem__, missing))
+        return (self.total - math.fsum(left_out),
+                self.squares - math.fsum(map(mul, left_out, left_out)))
+
+
+def _correlation_block(row_closes, column_closes=None):
+    """Computes one block of the correlation matrix, for use by a worker
+    process.
+
+    Parameters:
+        row_closes (list<array<float>>): Closing values of the stocks in the
+        block's rows, on the date axis.
+        column_closes (list<array<float>>): Closing values of the stocks in
+        the block's columns, or None if they are the rows' stocks.
+
+    Returns:
+        list<array<float>>: The correlations of each row's stock with the
+        column stocks.
+    """
+    rows = [_ReturnSeries(closes) for closes in row_closes]
+    columns = rows
+    if column_closes is not None:
+        columns = [_ReturnSeries(closes) for closes in column_closes]
+    return [array("d", [series.correlation(other) for other in columns])
+            for series in rows]
+
+
+def _return(previous, current):
+    """Returns the change from one closing value to the next as a fraction
+    of the first, or NaN if the first is 0 or either is NaN.
+    """
+    return current / previous - 1.0 if previous else NAN
+
+
+def _result(item):
+    """Returns the result of a (code, result) pair."""
+    return item[1]
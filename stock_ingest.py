@@ -0,0 +1,279 @@
+"""Continuous ingestion of stock market data files as they arrive in a
+directory.
+
+    IngestService: Watches a directory and loads each new .csv or .trp file
+    into a shared StockCollection, keeping registered analyses up to date.
+"""
+
+import asyncio
+import os
+import sys
+
+import stocks
+import stock_analysis
+
+
+class IngestService(object):
+    """Watches a directory for new or changed data files and loads them into
+    a StockCollection.
+
+    The directory is polled, and each file with a registered loader is parsed
+    by an executor into a collection of its own, so the event loop is never
+    blocked by reading or parsing. Parsed files are merged into the shared
+    collection one at a time, in the order they were found, so a file is
+    either loaded completely or, if it is invalid, not at all.
+
+    At most 'max_pending' files are parsed or waiting to be merged at once.
+    Once that many are in flight, polling waits for the merges to catch up.
+
+    Registered analyses are updated after each merge for the stocks in the
+    merged file only. They resume from checkpoints, so only the days added
+    since the last update are analysed when the new days are all newer and
+    the analyser's 'get_parameters' does not return None.
+
+    Files should be moved into the directory once complete, e.g. by
+    renaming them, so that a partly written file is not loaded. A file that
+    changes after it has been loaded is loaded again.
+    """
+
+    def __init__(self, directory, stocks, poll_interval=1.0, max_pending=4,
+                 executor=None):
+        """
+        Parameters:
+            directory (str): Directory into which data files are delivered.
+            stocks (StockCollection): Collection to which new data is added.
+            poll_interval (float): Seconds between scans of the directory.
+            max_pending (int): Maximum number of files being parsed or
+                               waiting to be merged.
+            executor (Executor): Parses files. Defaults to the event loop's
+                                 default executor. A ProcessPoolExecutor
+                                 parses several files in parallel.
+
+        Raises:
+            ValueError: If 'max_pending' is less than 1.
+        """
+        if max_pending < 1:
+            raise ValueError('max_pending must be at least 1.')
+        self._directory = directory
+        self._stocks = stocks
+        self._poll_interval = poll_interval
+        self._max_pending = max_pending
+        self._executor = executor
+        # Modification time and size of each file found, by path.
+        self._seen = {}
+        # Registered analyses by name, each an analyser factory and the
+        # checkpoint and result for each stock analysed.
+        self._analyses = {}
+        self._errors = []
+        self._stopping = None
+
+    def register(self, name, analyser_factory):
+        """Keep an analysis of every stock up to date as data arrives. Stocks
+        already in the collection are analysed straight away.
+
+        Parameters:
+            name (str): Name under which the results are kept.
+            analyser_factory (callable): Returns a new Analyser when called
+                with no arguments. Its results should only depend on the
+                stock's data, as it is given only the newly added days.
+        """
+        self._analyses[name] = (analyser_factory, {}, {})
+        self._update(self._stocks.get_codes(), [name])
+
+    def get_results(self, name):
+        """Returns the latest results of a registered analysis.
+
+        Parameters:
+            name (str): Name the analysis was registered under.
+
+        Returns:
+            dict<str, object>: The result for each stock, keyed by stock code,
+            or the exception raised by the analyser in place of its result.
+        """
+        return dict(self._analyses[name][2])
+
+    def get_errors(self):
+        """Returns the files that could not be loaded, and the scans of the
+        directory that failed.
+
+        Returns:
+            list<tuple<str, Exception>>: The name of each file, or of the
+            directory, and the error raised while loading or scanning it, in
+            the order they happened.
+        """
+        return list(self._errors)
+
+    async def poll(self):
+        """Scan the directory once, and load and analyse any new or changed
+        files.
+
+        Returns:
+            int: Number of files found.
+        """
+        return await self._pipeline(once=True)
+
+    async def run(self):
+        """Watch the directory until 'stop' is called. Files already found
+        are loaded before returning.
+        """
+        await self._pipeline(once=False)
+
+    def stop(self):
+        """Stop a running service after its current scan."""
+        if self._stopping is not None:
+            self._stopping.set()
+
+    async def _pipeline(self, once):
+        """Scans the directory, once or until stopped, passing the files
+        found through a bounded queue to be merged.
+
+        Returns:
+            int: Number of files found.
+        """
+        self._stopping = asyncio.Event()
+        queue = asyncio.Queue(self._max_pending)
+        slots = asyncio.Semaphore(self._max_pending)
+        merging = asyncio.create_task(self._merge(queue, slots))
+        found = 0
+        try:
+            while True:
+                found += await self._scan(queue, slots)
+                if once:
+                    break
+                try:
+                    await asyncio.wait_for(self._stopping.wait(),
+                                           self._poll_interval)
+                except asyncio.TimeoutError:
+                    continue
+                break
+        finally:
+            await queue.put(None)
+            await merging
+            self._stopping = None
+        return found
+
+    async def _scan(self, queue, slots):
+        """Starts parsing each new or changed file and queues it to be
+        merged, waiting while 'max_pending' files are in flight.
+
+        Parameters:
+            queue (Queue): Files waiting to be merged.
+            slots (Semaphore): Held by each file in flight until it is merged.
+
+        Returns:
+            int: Number of files found.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            filenames = await loop.run_in_executor(None, self._new_files)
+        except OSError as error:
+            # The directory may be briefly unavailable, e.g. while it is
+            # remounted, so the scan is retried at the next poll.
+            self._errors.append((self._directory, error))
+            return 0
+        for filename in filenames:
+            await slots.acquire()
+            parsed = loop.run_in_executor(self._executor, _parse_file,
+                                          filename)
+            await queue.put((filename, parsed))
+        return len(filenames)
+
+    def _new_files(self):
+        """Returns the files in the directory with a registered loader that
+        are new or have changed since the last scan, oldest first.
+
+        Returns:
+            list<str>: Names of the files.
+        """
+        found = []
+        with os.scandir(self._directory) as entries:
+            for entry in entries:
+                try:
+                    stocks.Loader.for_file(entry.name)
+                except RuntimeError:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    status = entry.stat()
+                except OSError:
+                    # The file was moved or removed after it was listed.
+                    continue
+                key = (status.st_mtime_ns, status.st_size)
+                if self._seen.get(entry.path) != key:
+                    self._seen[entry.path] = key
+                    found.append((key, entry.path))
+        return [path for key, path in sorted(found)]
+
+    async def _merge(self, queue, slots):
+        """Merges parsed files into the collection in the order they were
+        queued, until None is taken from the queue.
+
+        Parameters:
+            queue (Queue): Files waiting to be merged.
+            slots (Semaphore): Released as each file is merged.
+        """
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            filename, parsed = item
+            try:
+                loaded = await parsed
+            except Exception as error:
+                self._errors.append((filename, error))
+                continue
+            finally:
+                slots.release()
+            self._stocks.merge(loaded)
+            self._update(loaded.get_codes(), list(self._analyses))
+
+    def _update(self, codes, names):
+        """Updates registered analyses of the given stocks.
+
+        Parameters:
+            codes (list<str>): Codes of the stocks whose data has changed.
+            names (list<str>): Names of the analyses to update.
+        """
+        for name in names:
+            analyser_factory, checkpoints, results = self._analyses[name]
+            for code in codes:
+                analyser = analyser_factory()
+                stock = self._stocks.get_stock(code)
+                try:
+                    checkpoints[code] = stock.analyse_incremental(
+                        analyser, checkpoints.get(code))
+                    results[code] = analyser.result()
+                except Exception as error:
+                    checkpoints.pop(code, None)
+                    results[code] = error
+
+
+def _parse_file(filename):
+    """Loads one file into a new collection, for use by an executor.
+
+    Parameters:
+        filename (str): Name of the file from which to load data.
+
+    Returns:
+        StockCollection: The data loaded from the file.
+    """
+    loaded = stocks.StockCollection()
+    stocks.Loader.for_file(filename)(filename, loaded)
+    return loaded
+
+
+def example_usage(directory):
+    all_stocks = stocks.StockCollection()
+    service = IngestService(directory, all_stocks)
+    service.register("high_low", stock_analysis.HighLow)
+    service.register("average_volume", stocks.AverageVolume)
+    found = asyncio.run(service.poll())
+    print("Loaded", found, "files from", directory)
+    for filename, error in service.get_errors():
+        print("Could not load", filename + ":", error)
+    for code, high_low in sorted(service.get_results("high_low").items()):
+        print("Highest & Lowest trading price of", code, "is", high_low)
+
+if __name__ == "__main__":
+    example_usage(sys.argv[1] if len(sys.argv) > 1 else "data_files")
@@ -6,12 +6,35 @@
     TradingData: Data for a single day of trading in one stock.
     Loader: Abstract class defining the process of loading stock market data.
     Analyser: Abstract class defining the interface for analysing stock data.
+    TradingColumns: Data for a run of trading days in one stock, by column.
     AverageVolume: Analyse a single stock's data to determine its average volume.
+    Checkpoint: Progress of an analysis of one stock, from which it can resume.
+    Instrumentation: Opt-in record of the work done by loaders and analysers.
+    ResultCache: Least recently used cache of analysis results.
+    SharedCollection: A collection's trading data published in shared memory.
     
     __author__ = "Richard Thomas"
     __email__ = "richard.thomas@uq.edu.au"
 """
 
+import datetime
+import mmap
+import os
+import struct
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache, partial
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from itertools import count, groupby, islice
+from multiprocessing.shared_memory import SharedMemory
+from operator import itemgetter, lt
+from time import perf_counter
+from uuid import uuid4
+
+
 class TradingData(object) :
     """Stock market data for a single day of trading for one stock.
 
@@ -23,6 +46,9 @@ class TradingData(object) :
             Value of closing (final) trade
             Volume of shares traded
     """
+
+    # Instances have no __dict__, as many thousands of them may be created.
+    __slots__ = ("_date", "_open", "_high", "_low", "_close", "_volume")
     
     def __init__(self, date, day_open, day_high, day_low, day_close, volume) :
         """
@@ -41,6 +67,44 @@ class TradingData(object) :
         self._close = day_close
         self._volume = volume
 
+    @staticmethod
+    def from_columns(dates, opens, highs, lows, closes, volumes) :
+        """Create the trading data for many days from columns of values.
+
+        Parameters:
+            dates (list<str>): Dates in yyyymmdd format. Integer dates are
+                               converted to strings.
+            opens (list<float>): Value of the first trade of each day.
+            highs (list<float>): Value of the highest trade of each day.
+            lows (list<float>): Value of the lowest trade of each day.
+            closes (list<float>): Value of the last trade of each day.
+            volumes (list<int>): Number of shares traded on each day.
+
+        Return:
+            list<TradingData>: Trading data for each day, in column order.
+        """
+        return list(TradingData.iterate_columns(dates, opens, highs, lows,
+                                                closes, volumes))
+
+    @staticmethod
+    def iterate_columns(dates, opens, highs, lows, closes, volumes) :
+        """Like 'from_columns', but create each day's trading data only as
+            it is iterated over.
+
+        Return:
+            iterator<TradingData>: Trading data for each day, in column order.
+        """
+        return map(TradingData, map(str, dates), opens, highs, lows, closes,
+                   volumes)
+
+    @staticmethod
+    def _iterate_ordinals(dates, opens, highs, lows, closes, volumes) :
+        """Like 'iterate_columns', but with dates given as day ordinals, as
+            they are stored in TradingColumns.
+        """
+        return map(TradingData, map(_date_string, dates), opens, highs, lows,
+                   closes, volumes)
+
     def get_date(self) :
         """(str) The date of this day of trading."""
         return self._date
@@ -84,6 +148,107 @@ class TradingData(object) :
         self._volume = volume
 
 
+class TradingColumns(object) :
+    """Stock market data for a run of trading days for one stock, stored as
+        one sequence per field rather than one TradingData object per day.
+
+    Each of 'date', 'open', 'high', 'low', 'close' and 'volume' holds one
+    entry per day, in date order. Dates are day ordinals, as returned by
+    datetime.date.toordinal, so that calendar arithmetic on them is integer
+    arithmetic.
+    """
+
+    # Array type code of each column, in constructor order. The columns may
+    # be memoryviews or lists, so the type codes are not read from them.
+    _TYPECODES = ("i", "d", "d", "d", "d", "q")
+
+    def __init__(self, date, day_open, day_high, day_low, day_close, volume) :
+        """
+        Parameters:
+            date (array<int>): Dates as day ordinals.
+            day_open (array<float>): Value of the first trade of each day.
+            day_high (array<float>): Value of the highest trade of each day.
+            day_low (array<float>): Value of the lowest trade of each day.
+            day_close (array<float>): Value of the last trade of each day.
+            volume (array<int>): Number of shares traded on each day.
+        """
+        self.date = date
+        self.open = day_open
+        self.high = day_high
+        self.low = day_low
+        self.close = day_close
+        self.volume = volume
+
+    @staticmethod
+    def empty() :
+        """(TradingColumns) Empty arrays, ready to be extended."""
+        return TradingColumns(array("i"), array("d"), array("d"), array("d"),
+                              array("d"), array("q"))
+
+    @staticmethod
+    def ordinals(dates) :
+        """Convert dates in yyyymmdd format to day ordinals. Each distinct
+            date is converted once, however many times it appears.
+
+        Parameters:
+            dates (list): Dates in yyyymmdd format, as strings or integers.
+
+        Return:
+            array<int>: The day ordinal of each date, in the same order.
+
+        Raises:
+            ValueError: If any date is not a valid date.
+        """
+        ordinals = {date : _ordinal(date) for date in set(dates)}
+        return array("i", map(ordinals.__getitem__, dates))
+
+    def day(self, index) :
+        """(TradingData) The day of trading stored at 'index'."""
+        return TradingData(_date_string(self.date[index]), self.open[index],
+                           self.high[index], self.low[index],
+                           self.close[index], self.volume[index])
+
+    def days(self) :
+        """(iterator<TradingData>) The trading data of each day, created as
+            it is iterated over.
+        """
+        return TradingData._iterate_ordinals(self.date, self.open, self.high,
+                                             self.low, self.close, self.volume)
+
+    def slice(self, start, end) :
+        """(TradingColumns) A copy of the days from 'start' up to 'end'."""
+        return TradingColumns(self.date[start:end], self.open[start:end],
+                              self.high[start:end], self.low[start:end],
+                              self.close[start:end], self.volume[start:end])
+
+    def take(self, indices) :
+        """Return a copy of the days at 'indices', in that order.
+
+        Parameters:
+            indices (list<int>): Positions of the days to copy.
+
+        Return:
+            TradingColumns: The selected days, stored in arrays.
+        """
+        if len(indices) < 2 :
+            return TradingColumns(*(array(typecode,
+                                          [column[index] for index in indices])
+                                    for typecode, column in zip(
+                                        self._TYPECODES, self._all())))
+        select = itemgetter(*indices)
+        return TradingColumns(*(array(typecode, select(column))
+                                for typecode, column in zip(self._TYPECODES,
+                                                            self._all())))
+
+    def _all(self) :
+        """(tuple) All of the columns, in constructor order."""
+        return (self.date, self.open, self.high, self.low, self.close,
+                self.volume)
+
+    def __len__(self) :
+        return len(self.date)
+
+
 class Analyser(object) :
     """Abstract class representing any form of stock data analysis."""
     
@@ -95,10 +260,55 @@ class Analyser(object) :
         """
         raise NotImplementedError()
 
+    def process_batch(self, columns) :
+        """Collect and process a run of days of trading data in date order.
+
+        Subclasses may override this to process whole columns at once. The
+        result must be the same as calling 'process' for each day in turn.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+        """
+        for index in range(len(columns)) :
+            self.process(columns.day(index))
+
     def reset(self) :
         """Reset the analysis process in order to perform a new analysis."""
         raise NotImplementedError()
 
+    def get_state(self) :
+        """Return a copy of the analysis process's state, from which it can be
+            resumed with 'set_state'.
+
+        The default copies all of the analyser's attributes.
+
+        Return:
+            object: The state of the analysis.
+        """
+        return deepcopy(self.__dict__)
+
+    def get_parameters(self) :
+        """Return the parameters that, together with the analyser's type,
+            determine its result for any given trading data, so that results
+            can be cached.
+
+        The default is None, as the parameters of a subclass are not known.
+
+        Return:
+            tuple: The parameters, which must be hashable, or None if results
+            of this analysis must not be cached.
+        """
+        return None
+
+    def set_state(self, state) :
+        """Resume the analysis process from a state returned by 'get_state'.
+
+        Parameters:
+            state (object): The state of an analysis by the same type of
+                            analyser.
+        """
+        self.__dict__.update(deepcopy(state))
+
     def result(self) :
         """Abstract method representing obtaining the result of the analysis.
 
@@ -124,11 +334,24 @@ class AverageVolume(Analyser) :
         self._num_days_analysed += 1
         self._volume += day.get_volume()
 
+    def process_batch(self, columns) :
+        """Collect the total trading volume over a run of days.
+
+        Parameters:
+            columns (TradingColumns): Trading data for one stock.
+        """
+        self._num_days_analysed += len(columns)
+        self._volume += sum(columns.volume)
+
     def reset(self) :
         """Reset the analysis process in order to perform a new analysis."""
         self._num_days_analysed = 0
         self._volume = 0
 
+    def get_parameters(self) :
+        """(tuple) The analysis has no parameters."""
+        return ()
+
     def result(self) :
         """Return the average trading volume for the processed stock.
 
@@ -138,8 +361,198 @@ class AverageVolume(Analyser) :
         return self._volume // self._num_days_analysed
 
 
+class Checkpoint(object) :
+    """Progress of an analysis of one stock's trading data, returned by
+        Stock.analyse_incremental so that the analysis can later be resumed
+        with only the days added since.
+    """
+
+    def __init__(self, lineage, num_days, state, analysis=None) :
+        """
+        Parameters:
+            lineage (str): Identifies the stock's data. It changes whenever
+                           data other than a newer day is added to the stock.
+            num_days (int): Number of days that had been analysed.
+            state (object): The analyser's state, from Analyser.get_state.
+            analysis (tuple): The analyser's type and parameters, from
+                              Analyser.get_parameters, or None if the
+                              parameters are not known.
+        """
+        self._lineage = lineage
+        self._num_days = num_days
+        self._state = state
+        self._analysis = analysis
+
+    def get_num_days(self) :
+        """(int) Number of days that had been analysed."""
+        return self._num_days
+
+    def get_state(self) :
+        """(object) The analyser's state after analysing those days."""
+        return self._state
+
+
+class ResultCache(object) :
+    """Least recently used cache of the results of analysing stocks.
+
+    Results are keyed by stock, analyser type and parameters, date range and
+    the version of the stock's data. Adding data to a stock changes its
+    version, so a result is never returned once the data it was computed
+    from has changed. When the cache is full, the least recently used result
+    is discarded.
+    """
+
+    def __init__(self, max_size=1024) :
+        """
+        Parameters:
+            max_size (int): Maximum number of results kept.
+
+        Raises:
+            ValueError: If 'max_size' is less than 1.
+        """
+        if max_size < 1 :
+            raise ValueError("max_size must be at least 1.")
+        self._max_size = max_size
+        # Results by stock code, analyser type, parameters, start and end,
+        # each with the version of the stock's data it was computed from.
+        # Least recently used first.
+        self._results = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def analyse(self, stock, analyser, start=None, end=None) :
+        """Return the result of analysing 'stock' with 'analyser', which is
+            only used if the result is not already cached.
+
+        Results of analysers whose 'get_parameters' returns None are never
+        cached. Cached results are shared and must not be modified.
+
+        Parameters:
+            stock (Stock): The stock to analyse.
+            analyser (Analyser): A new analyser.
+            start (str): If given, only days from this yyyymmdd date onwards
+                         are analysed.
+            end (str): If given, only days up to and including this yyyymmdd
+                       date are analysed.
+
+        Return:
+            object: The analyser's result.
+        """
+        parameters = analyser.get_parameters()
+        version = stock.get_version()
+        key = (str(stock), type(analyser), parameters, start, end)
+        if parameters is not None :
+            cached = self._results.get(key)
+            if cached is not None and cached[0] == version :
+                self._results.move_to_end(key)
+                self._hits += 1
+                return cached[1]
+        self._misses += 1
+        stock.analyse(analyser, start, end)
+        result = analyser.result()
+        if parameters is not None :
+            self._results[key] = (version, result)
+            self._results.move_to_end(key)
+            if len(self._results) > self._max_size :
+                self._results.popitem(last=False)
+                self._evictions += 1
+        return result
+
+    def get_stats(self) :
+        """Return how well the cache has worked.
+
+        Return:
+            dict: 'hits' and 'misses' are the number of results found in and
+            computed for the cache, 'hit_rate' the fraction that were hits,
+            'evictions' the number discarded because the cache was full and
+            'size' the number of results held.
+        """
+        lookups = self._hits + self._misses
+        return {"hits": self._hits, "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions, "size": len(self._results)}
+
+    def clear(self) :
+        """Discard all cached results. The statistics are kept."""
+        self._results.clear()
+
+
+class Instrumentation(object) :
+    """Record of the work done by loaders and analysers while
+        instrumentation is enabled by 'enable_instrumentation'.
+
+    Each file loaded produces a load event, with the loader, file name, rows
+    parsed, rows rejected, bytes read and wall time. Each analysis of a stock
+    produces an analysis event, with the analyser, stock code, days processed
+    and the time spent in 'process' or 'process_batch' and in 'result'.
+    The time spent in 'result' is only recorded when the library calls it,
+    as Stock.analyse_many and StockCollection.analyse_all do.
+
+    Events from worker processes are recorded when their results are
+    returned to this process.
+    """
+
+    def __init__(self, callback=None) :
+        """
+        Parameters:
+            callback (callable): If given, called with each event, a dict,
+                                 as it is recorded.
+        """
+        self._callback = callback
+        self._loads = []
+        self._analysers = {}
+
+    def record(self, event) :
+        """Add an event to the totals and pass it to the callback.
+
+        Parameters:
+            event (dict): A load or analysis event. Its 'kind' is "load" or
+                          "analysis".
+        """
+        if event["kind"] == "load" :
+            self._loads.append(event)
+        else :
+            totals = self._analysers.setdefault(event["analyser"], {
+                "runs": 0, "days": 0, "process_seconds": 0.0,
+                "result_seconds": 0.0})
+            totals["runs"] += 1
+            totals["days"] += event["days"]
+            totals["process_seconds"] += event["process_seconds"]
+            totals["result_seconds"] += event["result_seconds"]
+        if self._callback is not None :
+            self._callback(event)
+
+    def get_stats(self) :
+        """Return the work recorded so far.
+
+        Return:
+            dict: 'loads' is the list of load events, in the order the files
+            were loaded. 'analysers' maps the name of each type of analyser
+            to its number of runs, days processed and total time spent in
+            'process' and 'result'.
+        """
+        return {"loads": [dict(event) for event in self._loads],
+                "analysers": {name : dict(totals) for name, totals
+                              in self._analysers.items()}}
+
+    def reset(self) :
+        """Discard the work recorded so far."""
+        self._loads = []
+        self._analysers = {}
+
+
 class Stock(object) :
-    """A single stock listed on the stock market and its trading data."""
+    """A single stock listed on the stock market and its trading data.
+
+    Trading data is stored column by column, in contiguous arrays kept in date
+    order, rather than as one TradingData object per day. TradingData objects
+    are only created when a day is requested or passed to an analyser.
+
+    Days that are newer than all existing data are appended. Days added out
+    of date order are held aside and merged into the columns the next time
+    the data is read, so a run of out of order additions costs one merge.
+    """
     
     def __init__(self, code) :
         """
@@ -147,17 +560,123 @@ class Stock(object) :
             code (str): Stock market code (unique identifier).
         """
         self._code = code
-        self._trading_data = {}
+        # Parallel columns of trading data, one entry per day, sorted by date.
+        # Dates are stored as day ordinals.
+        self._dates = array("i")
+        self._open = array("d")
+        self._high = array("d")
+        self._low = array("d")
+        self._close = array("d")
+        self._volume = array("q")
+        # True while the columns are read-only views of a snapshot file, or
+        # are shared with views returned by 'range'. The columns are copied
+        # before they are next changed.
+        self._mapped = False
+        # Days added out of date order and not yet merged into the columns,
+        # mapping each date to its (open, high, low, close, volume).
+        self._pending = {}
+        # Identifies the stock's data for checkpoints. Reset to None whenever
+        # a change other than appending a newer day is made.
+        self._lineage = None
+        # Identifies the stock's current data for cached results. A new
+        # version is taken, from all stocks' versions, on every change.
+        self._version = next(_versions)
 
     def add_day_data(self, day) :
         """Add one day of trading data to the stock's data.
 
+        If data already exists for the same date it is replaced.
+
         Parameters:
             day (TradingData): Trading data for one day.
         """
-        # Trading data key is the date stored in the TradingData object
-        # and value is the TradingData object.
-        self._trading_data[day.get_date()] = day
+        self._add_row(_ordinal(day.get_date()), day.get_open(), day.get_high(),
+                      day.get_low(), day.get_close(), day.get_volume())
+
+    def add_columns(self, columns) :
+        """Add a run of days of trading data to the stock's data.
+
+        Has the same effect as calling 'add_day_data' for each day in turn,
+        but a run of dates that follows the existing data in strictly
+        increasing order is appended in one step.
+
+        Parameters:
+            columns (TradingColumns): Trading data for this stock.
+        """
+        dates = columns.date
+        if not len(dates) :
+            return
+        self._version = next(_versions)
+        if self._mapped :
+            self._copy_mapped()
+        if ((not self._dates or dates[0] > self._dates[-1])
+                and all(map(lt, dates, islice(dates, 1, None)))) :
+            self._dates.extend(dates)
+            self._open.extend(columns.open)
+            self._high.extend(columns.high)
+            self._low.extend(columns.low)
+            self._close.extend(columns.close)
+            self._volume.extend(columns.volume)
+            return
+        for row in zip(dates, columns.open, columns.high, columns.low,
+                       columns.close, columns.volume) :
+            self._add_row(*row)
+
+    def _add_row(self, date, day_open, day_high, day_low, day_close, volume) :
+        """Add one day of trading data, with the date as a day ordinal,
+            replacing any existing data for the same date.
+        """
+        self._version = next(_versions)
+        if self._mapped :
+            self._copy_mapped()
+        dates = self._dates
+        # Data normally arrives in date order, so appending is the common case.
+        if not dates or date > dates[-1] :
+            dates.append(date)
+            self._open.append(day_open)
+            self._high.append(day_high)
+            self._low.append(day_low)
+            self._close.append(day_close)
+            self._volume.append(volume)
+            return
+        self._lineage = None
+        index = bisect_left(dates, date)
+        if dates[index] != date :
+            self._pending[date] = (day_open, day_high, day_low, day_close,
+                                   volume)
+        else :
+            self._open[index] = day_open
+            self._high[index] = day_high
+            self._low[index] = day_low
+            self._close[index] = day_close
+            self._volume[index] = volume
+
+    def _settle(self) :
+        """Merge days added out of date order into the columns."""
+        pending = self._pending
+        self._pending = {}
+        dates = sorted(pending)
+        if len(dates) <= _INSERT_LIMIT :
+            for date in dates :
+                index = bisect_left(self._dates, date)
+                self._dates.insert(index, date)
+                for column, value in zip((self._open, self._high, self._low,
+                                          self._close, self._volume),
+                                         pending[date]) :
+                    column.insert(index, value)
+            return
+        # Both runs are sorted and their dates are distinct, so the sort
+        # merges them in linear time.
+        values = list(zip(*map(pending.__getitem__, dates)))
+        combined = TradingColumns(
+            self._dates + array("i", dates),
+            self._open + array("d", values[0]),
+            self._high + array("d", values[1]),
+            self._low + array("d", values[2]),
+            self._close + array("d", values[3]),
+            self._volume + array("q", values[4]))
+        order = sorted(range(len(combined)), key=combined.date.__getitem__)
+        self._set_columns(combined.take(order))
 
     def get_day_data(self, date) :
         """Return the trading data for 'date'.
@@ -168,20 +687,381 @@ class Stock(object) :
         Return:
             TradingData: Trading details for the specified date or None.
         """
-        return self._trading_data.get(date)
+        index = self._find(date)
+        if index is None :
+            return None
+        return self._day(index)
 
-    def analyse(self, analyser) :
+    def analyse(self, analyser, start=None, end=None) :
         """Allow any type of analysis to be performed on this stock's
             trading data.
 
-        Data is processed in date order.
+        Data is processed in date order. Analysers that override
+        'process_batch' receive all of the data at once as columns, otherwise
+        'process' is called once for each day.
 
         Parameters:
             analyser (Analyser): The object that will perform the analysis.
+            start (str): If given, only days from this yyyymmdd date onwards
+                         are analysed.
+            end (str): If given, only days up to and including this yyyymmdd
+                       date are analysed.
         """
-        sorted_dates = sorted(self._trading_data.keys())
-        for date in sorted_dates :
-            analyser.process(self._trading_data[date])
+        self._feed(analyser, self.columns(start, end))
+
+    def analyse_incremental(self, analyser, checkpoint=None) :
+        """Analyse this stock's trading data, resuming from an earlier
+            analysis where possible.
+
+        If the checkpoint came from an analyser of the same type with the
+        same parameters, and the only changes to the stock since are newer
+        days, the analyser is restored to the checkpoint's state and given
+        only the new days. Otherwise, the analyser is reset and given all of
+        the data. Either way the analyser ends in the same state as after a
+        full analysis. Analysers whose 'get_parameters' returns None are
+        always given all of the data, as their checkpoints cannot be matched.
+
+        Parameters:
+            analyser (Analyser): The object that will perform the analysis.
+            checkpoint (Checkpoint): Returned by an earlier call on this
+                                     stock, or None.
+
+        Return:
+            Checkpoint: The progress of this analysis, to resume from later.
+        """
+        columns = self.columns()
+        if self._lineage is None :
+            self._lineage = uuid4().hex
+        parameters = analyser.get_parameters()
+        analysis = None
+        if parameters is not None :
+            analysis = (type(analyser), parameters)
+        if (checkpoint is not None and analysis is not None
+                and checkpoint._analysis == analysis
+                and checkpoint._lineage == self._lineage) :
+            analyser.set_state(checkpoint.get_state())
+            columns = columns.slice(checkpoint.get_num_days(), len(columns))
+        else :
+            analyser.reset()
+        self._feed(analyser, columns)
+        return Checkpoint(self._lineage, len(self._dates),
+                          analyser.get_state(), analysis)
+
+    def analyse_many(self, analysers, start=None, end=None) :
+        """Perform several analyses of this stock's trading data in one pass.
+
+        Analysers that override 'process_batch' receive the columns once.
+        The other analysers share one TradingData object for each day, so the
+        data is only traversed once however many analysers are given.
+
+        An exception raised by one analyser does not affect the others. The
+        analyser is not given any more data, and the exception is returned in
+        place of its result.
+
+        Parameters:
+            analysers (list<Analyser>): The objects that will perform the
+                                        analyses.
+            start (str): If given, only days from this yyyymmdd date onwards
+                         are analysed.
+            end (str): If given, only days up to and including this yyyymmdd
+                       date are analysed.
+
+        Return:
+            list: The result of each analyser, or the exception it raised, in
+            the same order as 'analysers'.
+        """
+        columns = self.columns(start, end)
+        # Time spent in processing and in 'result' by each analyser, only
+        # while instrumentation is enabled.
+        timings = None
+        if _instrumentation is not None :
+            timings = [[0.0, 0.0] for analyser in analysers]
+        errors = {}
+        per_day = []
+        for index, analyser in enumerate(analysers) :
+            process_batch = _batch_method(analyser)
+            if process_batch is None :
+                process = analyser.process
+                if timings is not None :
+                    process = _timed(process, timings[index], 0)
+                per_day.append((index, process))
+                continue
+            if timings is not None :
+                process_batch = _timed(process_batch, timings[index], 0)
+            try :
+                process_batch(columns)
+            except Exception as error :
+                errors[index] = error
+
+        for day in columns.days() if per_day else () :
+            failed = False
+            for index, process in per_day :
+                try :
+                    process(day)
+                except Exception as error :
+                    errors[index] = error
+                    failed = True
+            if failed :
+                per_day = [(index, process) for index, process in per_day
+                           if index not in errors]
+
+        results = []
+        for index, analyser in enumerate(analysers) :
+            if index in errors :
+                results.append(errors[index])
+                continue
+            try :
+                result = analyser.result
+                if timings is not None :
+                    result = _timed(result, timings[index], 1)
+                results.append(result())
+            except Exception as error :
+                results.append(error)
+                continue
+            if timings is not None :
+                _record_analysis(analyser, self._code, len(columns),
+                                 *timings[index])
+        return results
+
+    def columns(self, start=None, end=None) :
+        """Return the stock's trading data as columns.
+
+        Without a date range the columns share storage with the stock and
+        must not be modified.
+
+        Parameters:
+            start (str): If given, the first yyyymmdd date to include.
+            end (str): If given, the last yyyymmdd date to include.
+
+        Return:
+            TradingColumns: Trading data for this stock, in date order.
+        """
+        if self._pending :
+            self._settle()
+        columns = TradingColumns(self._dates, self._open, self._high,
+                                 self._low, self._close, self._volume)
+        if start is None and end is None :
+            return columns
+        return columns.slice(*self._bounds(start, end))
+
+    def range(self, start=None, end=None) :
+        """Return views of the stock's trading data from 'start' to 'end',
+            without copying it.
+
+        The views stay valid, and keep showing the same data, after more data
+        is added to the stock. The stock copies its columns before it is next
+        changed instead.
+
+        Parameters:
+            start (str): If given, the first yyyymmdd date to include.
+            end (str): If given, the last yyyymmdd date to include.
+
+        Return:
+            TradingColumns: Read-only memoryviews of the trading data, in date
+            order.
+        """
+        first, last = self._bounds(start, end)
+        self._mapped = True
+        return TradingColumns(*(memoryview(column)[first:last].toreadonly()
+                                for column in (self._dates, self._open,
+                                               self._high, self._low,
+                                               self._close, self._volume)))
+
+    def resample(self, period, start=None, end=None) :
+        """Summarise the stock's trading data as one bar per week or month.
+
+        Each bar has the first open, highest high, lowest low, last close and
+        total volume of the days in its period, and is dated with the last
+        day of trading in the period. Weeks start on Monday. Periods without
+        any trading have no bar.
+
+        Parameters:
+            period (str): 'W' for weekly bars or 'M' for monthly bars.
+            start (str): If given, only days from this yyyymmdd date onwards
+                         are included.
+            end (str): If given, only days up to and including this yyyymmdd
+                       date are included.
+
+        Return:
+            TradingColumns: One bar per period, in date order.
+
+        Raises:
+            ValueError: If 'period' is not 'W' or 'M'.
+        """
+        if period not in ("W", "M") :
+            raise ValueError("period must be 'W' or 'M'.")
+        bars = TradingColumns.empty()
+        first, last = self._bounds(start, end)
+        if first == last :
+            return bars
+        # Each period is the run of days between the positions of the first
+        # days of consecutive periods, found by binary search.
+        dates = self._dates
+        bounds = [bisect_left(dates, ordinal, first, last) for ordinal
+                  in _period_starts(period, dates[first], dates[last - 1])]
+        bounds.append(last)
+        opens, highs, lows, closes, volumes = (memoryview(column) for column
+                                               in (self._open, self._high,
+                                                   self._low, self._close,
+                                                   self._volume))
+        for head, tail in zip(bounds, islice(bounds, 1, None)) :
+            if head == tail :
+                continue
+            bars.date.append(dates[tail - 1])
+            bars.open.append(opens[head])
+            bars.high.append(max(highs[head:tail]))
+            bars.low.append(min(lows[head:tail]))
+            bars.close.append(closes[tail - 1])
+            bars.volume.append(sum(volumes[head:tail]))
+        return bars
+
+    def _bounds(self, start, end) :
+        """Return the first index and one past the last index of the days from
+            'start' to 'end', either of which may be None.
+
+        Parameters:
+            start (str): First yyyymmdd date to include, or None.
+            end (str): Last yyyymmdd date to include, or None.
+
+        Return:
+            tuple<int, int>: Bounds of the range in the date column.
+        """
+        if self._pending :
+            self._settle()
+        first = (0 if start is None
+                 else bisect_left(self._dates, _ordinal(start)))
+        last = (len(self._dates) if end is None
+                else bisect_right(self._dates, _ordinal(end)))
+        return first, max(first, last)
+
+    def _map(self, columns) :
+        """Use read-only views, such as those of a snapshot file, as this
+            stock's columns without copying them.
+
+        The views are copied into arrays the first time data is added.
+
+        Parameters:
+            columns (TradingColumns): Views of the date, open, high, low,
+                                      close and volume columns.
+        """
+        self._set_columns(columns)
+        self._mapped = True
+
+    def _feed(self, analyser, columns, result=False) :
+        """Give 'columns' to 'analyser', all at once if it overrides
+            'process_batch' and otherwise one day at a time.
+
+        Parameters:
+            analyser (Analyser): The object that will perform the analysis.
+            columns (TradingColumns): The trading data to analyse.
+            result (bool): If True, return the analyser's result.
+
+        Return:
+            object: The analyser's result if 'result' is True, else None.
+        """
+        if _instrumentation is not None :
+            return self._instrumented_feed(analyser, columns, result)
+        process_batch = _batch_method(analyser)
+        if process_batch is not None :
+            process_batch(columns)
+        else :
+            for day in columns.days() :
+                analyser.process(day)
+        if result :
+            return analyser.result()
+
+    def _instrumented_feed(self, analyser, columns, result) :
+        """As '_feed', recording an analysis event for the work done."""
+        started = perf_counter()
+        process_batch = _batch_method(analyser)
+        if process_batch is not None :
+            process_batch(columns)
+        else :
+            for day in columns.days() :
+                analyser.process(day)
+        process_seconds = perf_counter() - started
+        value = None
+        result_seconds = 0.0
+        if result :
+            started = perf_counter()
+            value = analyser.result()
+            result_seconds = perf_counter() - started
+        _record_analysis(analyser, self._code, len(columns), process_seconds,
+                         result_seconds)
+        return value
+
+    def _set_columns(self, columns) :
+        """Replace all of the stock's columns.
+
+        Parameters:
+            columns (TradingColumns): The new columns, sorted by date.
+        """
+        self._dates = columns.date
+        self._open = columns.open
+        self._high = columns.high
+        self._low = columns.low
+        self._close = columns.close
+        self._volume = columns.volume
+
+    def _copy_mapped(self) :
+        """Copy mapped columns into arrays so that they can be changed."""
+        (self._dates, self._open, self._high, self._low, self._close,
+         self._volume) = self._copied_columns()
+        self._mapped = False
+
+    def _copied_columns(self) :
+        """(list<array>) Copies of the date, open, high, low, close and volume
+            columns.
+        """
+        columns = []
+        for typecode, view in (("i", self._dates), ("d", self._open),
+                               ("d", self._high), ("d", self._low),
+                               ("d", self._close), ("q", self._volume)) :
+            column = array(typecode)
+            column.frombytes(memoryview(view).cast("B"))
+            columns.append(column)
+        return columns
+
+    def __getstate__(self) :
+        # Views of a snapshot file or shared memory cannot be pickled, so copy
+        # them.
+        state = self.__dict__.copy()
+        if self._mapped :
+            state.update(zip(("_dates", "_open", "_high", "_low", "_close",
+                              "_volume"), self._copied_columns()))
+            state["_mapped"] = False
+        return state
+
+    def _find(self, date) :
+        """Return the index of 'date' in the date column, or None if there is
+            no trading data for 'date'.
+
+        Parameters:
+            date (str): Date in yyyymmdd format.
+        """
+        try :
+            date = _ordinal(date)
+        except (ValueError, OverflowError) :
+            return None
+        if self._pending :
+            self._settle()
+        index = bisect_left(self._dates, date)
+        if index < len(self._dates) and self._dates[index] == date :
+            return index
+        return None
+
+    def _day(self, index) :
+        """(TradingData) A view of the day of trading stored at 'index'."""
+        return self.columns().day(index)
+
+    def get_version(self) :
+        """(int) Identifies the stock's current trading data. It changes
+            whenever data is added, and no two stocks have the same version.
+        """
+        return self._version
+
+    def __len__(self) :
+        return len(self._dates) + len(self._pending)
 
     def __str__(self) :
         return self._code
@@ -192,6 +1072,10 @@ class StockCollection(object) :
 
     def __init__(self) :
         self._all_stocks = {}
+        # Number of stock lookups that found an existing stock, and that
+        # created a new one.
+        self._hits = 0
+        self._misses = 0
 
     def get_stock(self, stock_code) :
         """Look up a stock object based on its stock market code.
@@ -209,9 +1093,354 @@ class StockCollection(object) :
         # mapped to 'Stock' objects.
         # Either the stock is found in '_all_stocks' or a new 'Stock' object is
         # created if this is the first time this stock code has been loaded.
-        self._all_stocks[stock_code] = self._all_stocks.get(stock_code,
-                                                            Stock(stock_code))
-        return self._all_stocks[stock_code]
+        stock = self._all_stocks.get(stock_code)
+        if stock is None :
+            self._misses += 1
+            stock = self._all_stocks[stock_code] = Stock(stock_code)
+        else :
+            self._hits += 1
+        return stock
+
+    def get_stocks(self, stock_codes) :
+        """Look up many stock objects based on their stock market codes.
+
+        Has the same effect as calling 'get_stock' for each code in turn, but
+        the lookups are made in one step and a new stock object is only
+        created for a code that is not already in the collection.
+
+        Parameters:
+            stock_codes (list<str>): Stock market codes used to look up stocks.
+
+        Return:
+            list<Stock>: The stock market object for each code, in order.
+        """
+        # New stocks are added in order of first appearance, as they would be
+        # by 'get_stock'.
+        missing = [code for code in dict.fromkeys(stock_codes)
+                   if code not in self._all_stocks]
+        for code in missing :
+            self._all_stocks[code] = Stock(code)
+        self._misses += len(missing)
+        self._hits += len(stock_codes) - len(missing)
+        return list(map(self._all_stocks.__getitem__, stock_codes))
+
+    def get_lookup_stats(self) :
+        """Return the number of stock lookups made through 'get_stock' and
+            'get_stocks'.
+
+        Return:
+            dict<str, int>: 'hits' is the number of lookups that found an
+            existing stock and 'misses' the number that created a new one.
+        """
+        return {"hits": self._hits, "misses": self._misses}
+
+    def add_columns(self, codes, columns) :
+        """Add trading data for many stocks at once.
+
+        Rows are grouped by stock code so that each stock receives all of its
+        rows in one call. Rows for the same stock keep their order, so a later
+        row for the same date replaces an earlier one.
+
+        Parameters:
+            codes (list<str>): Stock market code of each row.
+            columns (TradingColumns): Trading data, one row per entry in
+                                      'codes', stored in arrays.
+        """
+        if not codes :
+            return
+        # A stable sort by code gives each stock a contiguous run of rows.
+        order = sorted(range(len(codes)), key=codes.__getitem__)
+        columns = columns.take(order)
+        group_codes = []
+        group_sizes = []
+        for code, rows in groupby(map(codes.__getitem__, order)) :
+            group_codes.append(code)
+            group_sizes.append(len(list(rows)))
+        start = 0
+        for stock, size in zip(self.get_stocks(group_codes), group_sizes) :
+            stock.add_columns(columns.slice(start, start + size))
+            start += size
+
+    def merge(self, other) :
+        """Add all of the trading data in another collection to this one.
+
+        Data in 'other' replaces data in this collection for the same stock
+        and date.
+
+        Parameters:
+            other (StockCollection): Collection of stock market data to add.
+        """
+        for stock, other_stock in zip(self.get_stocks(list(other._all_stocks)),
+                                      other._all_stocks.values()) :
+            stock.add_columns(other_stock.columns())
+
+    def load_many(self, filenames, workers=None) :
+        """Load trading data from many files, parsing them in parallel.
+
+        The loader for each file is chosen by its extension. Files are parsed
+        in separate processes, each into its own collection, and merged into
+        this collection in the order of 'filenames'. A later file replaces
+        data from an earlier file for the same stock and date, as it would if
+        the files were loaded one after another.
+
+        Parameters:
+            filenames (list<str>): Names of the files from which to load data.
+            workers (int): Maximum number of processes used to parse files.
+                           Defaults to the number of processors. If 1, the
+                           files are loaded in this process.
+
+        Raises:
+            RuntimeError: If a file has no registered loader or is invalid.
+        """
+        loaders = [Loader.for_file(filename) for filename in filenames]
+        if workers == 1 or len(filenames) < 2 :
+            for loader, filename in zip(loaders, filenames) :
+                loader(filename, self)
+            return
+        instrumented = [_instrumentation is not None] * len(filenames)
+        with ProcessPoolExecutor(workers) as pool :
+            for loaded, events in pool.map(_load_file, loaders, filenames,
+                                           instrumented) :
+                _record_events(events)
+                self.merge(loaded)
+
+    def analyse_all(self, analyser_factory, workers=None, codes=None,
+                    start=None, end=None) :
+        """Analyse every stock in the collection, in parallel.
+
+        A new analyser is created for each stock, and stocks are analysed in
+        separate processes.
+
+        Parameters:
+            analyser_factory (callable): Returns a new Analyser when called
+                with no arguments, e.g. an Analyser subclass or a
+                functools.partial. It must be picklable, so it cannot be a
+                lambda.
+            workers (int): Maximum number of processes used. Defaults to the
+                           number of processors. If 1, stocks are analysed in
+                           this process.
+            codes (list<str>): If given, only these stocks are analysed.
+            start (str): If given, only days from this yyyymmdd date onwards
+                         are analysed.
+            end (str): If given, only days up to and including this yyyymmdd
+                       date are analysed.
+
+        Return:
+            dict<str, object>: The result of the analysis of each stock, keyed
+            by stock code. Stocks without any trading data in the date range
+            are left out.
+        """
+        if codes is None :
+            stocks = list(self._all_stocks.values())
+        else :
+            stocks = [self._all_stocks[code] for code in codes
+                      if code in self._all_stocks]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(stocks) < 2 :
+            analyse = partial(_analyse_stock, analyser_factory, start, end)
+            results = list(map(analyse, stocks))
+        else :
+            analyse = partial(_analyse_in_worker, analyser_factory, start,
+                              end, _instrumentation is not None)
+            results = []
+            with ProcessPoolExecutor(workers) as pool :
+                chunk_size = max(1, len(stocks) // (4 * workers))
+                for result, events in pool.map(analyse, stocks,
+                                               chunksize=chunk_size) :
+                    _record_events(events)
+                    results.append(result)
+        return dict(result for result in results if result is not None)
+
+    def save_snapshot(self, filename) :
+        """Save all of the trading data in the collection to a binary
+            snapshot file, which can be reopened with 'open_snapshot'.
+
+        The file starts with an index of stock codes, each with its number of
+        days and the position of its data. Each stock's data follows as
+        fixed-width date, open, high, low, close and volume columns, in the
+        native byte order of this machine.
+
+        The snapshot is written to a new file in the same directory, which
+        then replaces 'filename'. An existing snapshot is never truncated, so
+        collections opened from it, here or in other processes, keep their
+        data.
+
+        Parameters:
+            filename (str): Name of the file to write.
+        """
+        directory, name = os.path.split(os.path.abspath(filename))
+        temporary = os.path.join(directory,
+                                 ".{0}.{1}.tmp".format(name, uuid4().hex))
+        try :
+            with open(temporary, "xb") as file :
+                self._write_snapshot(file.write)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, filename)
+        except BaseException :
+            try :
+                os.remove(temporary)
+            except OSError :
+                pass
+            raise
+
+    def _snapshot_index(self) :
+        """Return the header and index of a snapshot of the collection.
+
+        Return:
+            tuple<bytes, int>: The header and index, padded to a multiple of
+            8 bytes, and the size of the whole snapshot.
+        """
+        entries = []
+        for code in self._all_stocks :
+            entries.append(code.encode("utf-8"))
+        position = _aligned(_SNAPSHOT_HEADER.size + sum(
+            _SNAPSHOT_ENTRY.size + len(code) for code in entries))
+
+        index = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION,
+                                       _SNAPSHOT_BYTE_ORDER, len(entries))]
+        for code, stock in zip(entries, self._all_stocks.values()) :
+            index.append(_SNAPSHOT_ENTRY.pack(len(code), len(stock), position))
+            index.append(code)
+            position += _snapshot_size(len(stock))
+        index = b"".join(index)
+        return index + bytes(_aligned(len(index)) - len(index)), position
+
+    def _write_snapshot(self, write) :
+        """Write a snapshot of the collection, in order, with 'write'.
+
+        Parameters:
+            write (callable): Called with each successive piece of the
+                              snapshot, as an object supporting the buffer
+                              protocol.
+        """
+        write(self._snapshot_index()[0])
+        for stock in self._all_stocks.values() :
+            columns = stock.columns()
+            write(columns.date)
+            write(bytes(_aligned(4 * len(columns)) - 4 * len(columns)))
+            for column in (columns.open, columns.high, columns.low,
+                           columns.close, columns.volume) :
+                write(column)
+
+    @staticmethod
+    def open_snapshot(filename) :
+        """Open a snapshot file written by 'save_snapshot'.
+
+        The file is memory-mapped and each stock's columns are views of the
+        mapped file, so opening only reads the index. Pages of trading data
+        are read when a stock is analysed, and a stock's data is only copied
+        into memory if more data is added to it.
+
+        Parameters:
+            filename (str): Name of the snapshot file.
+
+        Return:
+            StockCollection: The trading data stored in the snapshot.
+
+        Raises:
+            RuntimeError: If the file is not a valid snapshot.
+        """
+        with open(filename, "rb") as file :
+            try :
+                data = memoryview(mmap.mmap(file.fileno(), 0,
+                                            access=mmap.ACCESS_READ))
+            except ValueError :
+                raise RuntimeError("the file is not a stock snapshot.")
+        return StockCollection._read_snapshot(data)
+
+    @staticmethod
+    def _read_snapshot(data) :
+        """Return a collection whose stocks' columns are views of 'data'.
+
+        Parameters:
+            data (memoryview): A snapshot, from its first byte.
+
+        Return:
+            StockCollection: The trading data stored in the snapshot.
+
+        Raises:
+            RuntimeError: If 'data' is not a valid snapshot.
+        """
+        try :
+            magic, version, byte_order, count = _SNAPSHOT_HEADER.unpack_from(
+                data, 0)
+        except struct.error :
+            raise RuntimeError("the file is not a stock snapshot.")
+        if magic != _SNAPSHOT_MAGIC or byte_order != _SNAPSHOT_BYTE_ORDER :
+            raise RuntimeError("the file is not a stock snapshot.")
+        if version != _SNAPSHOT_VERSION :
+            raise RuntimeError("snapshot version {0} is not supported, it "
+                               "must be saved again.".format(version))
+
+        collection = StockCollection()
+        position = _SNAPSHOT_HEADER.size
+        try :
+            for _ in range(count) :
+                length, num_days, offset = _SNAPSHOT_ENTRY.unpack_from(
+                    data, position)
+                position += _SNAPSHOT_ENTRY.size
+                code = bytes(data[position:position + length]).decode("utf-8")
+                position += length
+                if offset + _snapshot_size(num_days) > len(data) :
+                    raise RuntimeError("the snapshot file is truncated.")
+                stock = Stock(code)
+                stock._map(_snapshot_columns(data, offset, num_days))
+                collection._all_stocks[code] = stock
+        except (struct.error, UnicodeDecodeError) :
+            raise RuntimeError("the snapshot file is corrupt.")
+        return collection
+
+    def publish(self) :
+        """Publish the collection's trading data in a shared memory block,
+            from which other processes can analyse it without copying it.
+
+        Return:
+            SharedCollection: The published data. It should be closed when it
+            is no longer needed.
+        """
+        return SharedCollection(self)
+
+    @staticmethod
+    def attach(name) :
+        """Attach to trading data published by 'StockCollection.publish'.
+
+        The stocks' columns are read-only views of the shared memory block.
+        A stock's data is only copied into this process if more data is added
+        to it. The block is mapped into this process separately from the
+        SharedMemory object used to find it, so it stays mapped for as long as
+        any view of it is in use, including columns returned by
+        'Stock.columns' or 'Stock.range' after the collection is freed. It is
+        unmapped when the last view is released.
+
+        Processes that attach should be started by the publishing process, as
+        the block is removed when the processes sharing the publisher's
+        resource tracker have all exited.
+
+        Parameters:
+            name (str): Name of the shared memory block, from
+                        SharedCollection.get_name.
+
+        Return:
+            StockCollection: The published trading data.
+
+        Raises:
+            RuntimeError: If there is no valid block with that name.
+        """
+        try :
+            memory = SharedMemory(name)
+        except FileNotFoundError :
+            raise RuntimeError("there is no shared collection '{0}'."
+                               .format(name))
+        try :
+            data = memoryview(_map_shared(memory))
+        finally :
+            memory.close()
+        return StockCollection._read_snapshot(data)
+
+    def get_codes(self) :
+        """(list<str>) Codes of all stocks in the collection."""
+        return list(self._all_stocks)
 
     def list_stocks(self) :
         """Simple output of all stocks in the collection."""
@@ -219,8 +1448,125 @@ class StockCollection(object) :
             print("{0}".format(stock))
         
 
+class SharedCollection(object) :
+    """The trading data of a StockCollection, published in a shared memory
+        block for analysis by other processes.
+
+    The block holds the data in the snapshot file format, an index of stock
+    codes and the position of each stock's columns, followed by the columns.
+    Processes attach to it with 'StockCollection.attach' and analyse views of
+    the block, so no trading data is copied or pickled.
+
+    The block is removed by 'close', when the SharedCollection is garbage
+    collected or when the interpreter exits. If the process is killed, the
+    block is removed by its resource tracker.
+    """
+
+    def __init__(self, collection) :
+        """
+        Parameters:
+            collection (StockCollection): The trading data to publish. Later
+                changes to the collection are not published.
+        """
+        index, size = collection._snapshot_index()
+        self._memory = SharedMemory(create=True, size=size)
+        self._closer = weakref.finalize(self, _close_shared, self._memory)
+        collection._write_snapshot(_buffer_writer(self._memory.buf))
+        self._codes = collection.get_codes()
+
+    def get_name(self) :
+        """(str) Name of the shared memory block, to attach to it by."""
+        return self._memory.name
+
+    def get_codes(self) :
+        """(list<str>) Codes of all stocks published."""
+        return list(self._codes)
+
+    def analyse_all(self, analyser_factory, workers=None, codes=None,
+                    start=None, end=None) :
+        """Analyse every published stock in worker processes that attach to
+            the shared memory block.
+
+        Only stock codes are sent to the workers, and only results are sent
+        back. The parameters and result are those of
+        'StockCollection.analyse_all'.
+        """
+        if codes is None :
+            codes = self._codes
+        else :
+            published = set(self._codes)
+            codes = [code for code in codes if code in published]
+        workers = workers or os.cpu_count() or 1
+        if workers == 1 or len(codes) < 2 :
+            return StockCollection.attach(self.get_name()).analyse_all(
+                analyser_factory, 1, codes, start, end)
+        analyse = partial(_analyse_shared, analyser_factory, start, end,
+                          _instrumentation is not None)
+        results = []
+        with ProcessPoolExecutor(workers, initializer=_attach_shared,
+                                 initargs=(self.get_name(),)) as pool :
+            chunk_size = max(1, len(codes) // (4 * workers))
+            for result, events in pool.map(analyse, codes,
+                                           chunksize=chunk_size) :
+                _record_events(events)
+                results.append(result)
+        return dict(result for result in results if result is not None)
+
+    def close(self) :
+        """Remove the shared memory block. Collections already attached to it
+            keep their views until they are freed. Closing again does nothing.
+        """
+        self._closer()
+
+    def __enter__(self) :
+        return self
+
+    def __exit__(self, *exc_info) :
+        self.close()
+
+
 class Loader(object) :
-    """Abstract class defining basic process of loading trading data."""
+    """Abstract class defining basic process of loading trading data.
+
+    Subclasses that set 'extension' in their own class body are registered
+    as the loader for files with that extension. A subclass that inherits
+    'extension' from another loader is not registered, so it does not
+    replace that loader for every file of its type.
+
+    Loading is checked before the file is parsed. The file name must have
+    the loader's extension, and the first line must not look like a file of
+    another registered type. Loading is all or nothing: data is staged and
+    only added to the collection once the whole file has been parsed.
+    """
+
+    # File extension, without the '.', of the files a subclass loads.
+    extension = None
+    # Registered loaders, keyed by file extension.
+    _loaders = {}
+
+    def __init_subclass__(cls, **kwargs) :
+        super().__init_subclass__(**kwargs)
+        if cls.__dict__.get("extension") is not None :
+            Loader._loaders[cls.extension] = cls
+
+    @staticmethod
+    def for_file(filename) :
+        """Return the loader registered for the extension of 'filename'.
+
+        Parameters:
+            filename (str): Name of the file to be loaded.
+
+        Return:
+            type: The Loader subclass that loads files of this type.
+
+        Raises:
+            RuntimeError: If no loader is registered for the extension.
+        """
+        extension = filename.split(".")[-1]
+        try :
+            return Loader._loaders[extension]
+        except KeyError :
+            raise RuntimeError("no loader for '.{0}' files.".format(extension))
     
     def __init__(self, filename, stocks) :
         """Data is loaded on object creation.
@@ -229,18 +1575,406 @@ class Loader(object) :
             filename (str): Name of the file from which to load data.
             stocks (StockCollection): Collection of existing stock market data
                                       to which the new data will be added.
+
+        Raises:
+            RuntimeError: If the file is of the wrong type or is invalid. No
+                          data from the file is added to 'stocks'.
         """
+        # Reject files of the wrong type before opening them.
+        self._file_validate(filename)
+        # Data is parsed into a collection of its own, which is only added to
+        # 'stocks' once the whole file has been parsed.
+        self._stocks = StockCollection()
+        # Number of rows parsed, counted by the subclass.
+        self._rows = 0
+        if _instrumentation is not None :
+            self._instrumented_load(filename, stocks)
+            return
+        with open(filename, "r") as file :
+            self._load(file, stocks)
+
+    def _load(self, file, stocks) :
+        """Check the first line of 'file', parse the file and add its data to
+            'stocks'.
+        """
+        self._sniff(file)
+        # Use format specific subclass to parse the data in the file.
+        self._process(file)
+        stocks.merge(self._stocks)
         # Maintain a reference to the stock colletion into which data is loaded.
         self._stocks = stocks
+
+    def _sniff(self, file) :
+        """Check that the first line of 'file' does not look like a file
+            loaded by another registered loader.
+
+        Raises:
+            RuntimeError: If the first line looks like another type of file.
+        """
+        line = file.readline()
+        file.seek(0)
+        if self._matches(line) :
+            return
+        for extension, loader in Loader._loaders.items() :
+            if (loader is not type(self)
+                    and loader._matches is not Loader._matches
+                    and loader._matches(line)) :
+                raise RuntimeError("the file must be a .{0} file, it looks "
+                                   "like a .{1} file.".format(self.extension,
+                                                              extension))
+
+    @staticmethod
+    def _matches(line) :
+        """Return whether 'line' looks like the first line of a file this
+            loader loads. Loaders that do not check their content match every
+            line.
+
+        Parameters:
+            line (str): The first line of a file.
+
+        Return:
+            bool: True if the line has the loader's format.
+        """
+        return True
+
+    @classmethod
+    def _file_validate(cls, filename) :
+        """Validates whether if the file has the loader's extension.
+
+        Raises:
+            RuntimeError: If the filename does not have the correct extension
+        """
+        if (cls.extension is not None
+                and filename.split(".")[-1] != cls.extension) :
+            raise RuntimeError("the file must be a .{0} file."
+                               .format(cls.extension))
+
+    def _instrumented_load(self, filename, stocks) :
+        """As loading on object creation, recording a load event for the
+            work done. A file that fails to load counts one rejected row.
+        """
+        started = perf_counter()
+        rejected = 0
         with open(filename, "r") as file :
-            # Use format specific subclass to parse the data in the file.
-            self._process(file)
+            try :
+                self._load(file, stocks)
+            except RuntimeError :
+                rejected = 1
+                raise
+            finally :
+                _instrumentation.record({
+                    "kind": "load", "loader": type(self).__name__,
+                    "filename": filename, "rows": self._rows,
+                    "rejected": rejected, "bytes": file.buffer.tell(),
+                    "seconds": perf_counter() - started})
 
     def _process(self, file) :
         """Load and parse the stock market data from 'file'."""
         raise NotImplementedError()
 
 
+# The Instrumentation recording loaders and analysers, or None if
+# instrumentation is disabled.
+_instrumentation = None
+
+
+def enable_instrumentation(callback=None) :
+    """Start recording the work done by loaders and analysers, replacing any
+        earlier record.
+
+    Parameters:
+        callback (callable): If given, called with each event as it is
+                             recorded.
+
+    Return:
+        Instrumentation: The record, from which stats can be read.
+    """
+    global _instrumentation
+    _instrumentation = Instrumentation(callback)
+    return _instrumentation
+
+
+def disable_instrumentation() :
+    """Stop recording the work done by loaders and analysers.
+
+    Return:
+        Instrumentation: The record of the work done while enabled, or None
+        if instrumentation was not enabled.
+    """
+    global _instrumentation
+    instrumentation, _instrumentation = _instrumentation, None
+    return instrumentation
+
+
+def get_instrumentation() :
+    """(Instrumentation) The current record, or None if disabled."""
+    return _instrumentation
+
+
+def _batch_method(analyser) :
+    """Return the analyser's 'process_batch' method if its class overrides
+        Analyser's, or None if it must be given one day at a time.
+
+    Analyser's own 'process_batch' calls 'process' for each day, so an
+    analyser that only implements 'process' is fed by the caller, which can
+    then share each day's TradingData between several analysers.
+    """
+    process_batch = getattr(type(analyser), "process_batch", None)
+    if process_batch is None or process_batch is Analyser.process_batch :
+        return None
+    return analyser.process_batch
+
+
+def _timed(function, timings, index) :
+    """Wrap 'function' so that the time spent in each call is added to
+        timings[index].
+    """
+    def timed(*args) :
+        started = perf_counter()
+        try :
+            return function(*args)
+        finally :
+            timings[index] += perf_counter() - started
+    return timed
+
+
+def _record_analysis(analyser, code, days, process_seconds, result_seconds) :
+    """Record an analysis event, if instrumentation is enabled."""
+    if _instrumentation is not None :
+        _instrumentation.record({
+            "kind": "analysis", "analyser": type(analyser).__name__,
+            "stock": code, "days": days, "process_seconds": process_seconds,
+            "result_seconds": result_seconds})
+
+
+def _record_events(events) :
+    """Record events returned by a worker process."""
+    if _instrumentation is not None :
+        for event in events :
+            _instrumentation.record(event)
+
+
+def _worker_events(instrumented) :
+    """Start collecting events in a worker process if the parent is
+        recording, or stop recording into a record inherited from the parent.
+
+    Return:
+        list<dict>: The events recorded from now on, to be returned to the
+        parent process.
+    """
+    global _instrumentation
+    events = []
+    _instrumentation = Instrumentation(events.append) if instrumented else None
+    return events
+
+
+def _ordinal(date) :
+    """(int) The day ordinal of a date in yyyymmdd format, as a string or
+        integer. Raises ValueError if it is not a valid date.
+    """
+    number = int(date)
+    return datetime.date(number // 10000, number // 100 % 100,
+                         number % 100).toordinal()
+
+
+@lru_cache(maxsize=None)
+def _date_string(ordinal) :
+    """(str) The date in yyyymmdd format of a day ordinal."""
+    date = datetime.date.fromordinal(ordinal)
+    return "{0:04d}{1:02d}{2:02d}".format(date.year, date.month, date.day)
+
+
+def _period_starts(period, first, last) :
+    """Return the day ordinals of the first days of the weeks or months from
+        the one containing 'first' to the one containing 'last'.
+
+    Parameters:
+        period (str): 'W' for weeks or 'M' for months.
+        first (int): Day ordinal of a day in the first period.
+        last (int): Day ordinal of a day in the last period.
+
+    Return:
+        list<int>: Day ordinal of the first day of each period.
+    """
+    if period == "W" :
+        # Day ordinal 1, 1 January of year 1, was a Monday.
+        return list(range(first - (first - 1) % 7, last + 1, 7))
+    date = datetime.date.fromordinal(first)
+    year, month = date.year, date.month
+    starts = []
+    while True :
+        start = datetime.date(year, month, 1).toordinal()
+        if start > last :
+            return starts
+        starts.append(start)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+# Source of Stock versions, which are unique across all stocks.
+_versions = count()
+
+# Stock merges at most this many out of order days by inserting each one,
+# and merges more by rebuilding its columns.
+_INSERT_LIMIT = 16
+
+# Snapshot files start with a marker, version, byte order check and the
+# number of stocks. Each index entry is the length of the stock code, the
+# number of days and the position of the stock's data, followed by the code.
+_SNAPSHOT_MAGIC = b"STOCKSNP"
+# Version 2 stores dates as day ordinals rather than yyyymmdd integers.
+_SNAPSHOT_VERSION = 2
+_SNAPSHOT_BYTE_ORDER = 0x0102
+_SNAPSHOT_HEADER = struct.Struct("=8sHHI")
+_SNAPSHOT_ENTRY = struct.Struct("=HQQ")
+
+
+def _aligned(size) :
+    """(int) 'size' rounded up to a multiple of 8 bytes."""
+    return (size + 7) & ~7
+
+
+def _snapshot_size(num_days) :
+    """(int) Size in bytes of one stock's data in a snapshot file."""
+    return _aligned(4 * num_days) + 5 * 8 * num_days
+
+
+def _snapshot_columns(data, offset, num_days) :
+    """Return views of one stock's columns in a snapshot file.
+
+    Parameters:
+        data (memoryview): The whole snapshot file.
+        offset (int): Position of the stock's data in the file.
+        num_days (int): Number of days of data stored for the stock.
+
+    Return:
+        TradingColumns: Read-only views of the stock's columns.
+    """
+    dates = data[offset:offset + 4 * num_days].cast("i")
+    offset += _aligned(4 * num_days)
+    views = []
+    for typecode in ("d", "d", "d", "d", "q") :
+        views.append(data[offset:offset + 8 * num_days].cast(typecode))
+        offset += 8 * num_days
+    return TradingColumns(dates, *views)
+
+
+def _analyse_stock(analyser_factory, start, end, stock) :
+    """Analyse one stock with a new analyser.
+
+    Parameters:
+        analyser_factory (callable): Returns a new Analyser.
+        start (str): First yyyymmdd date to analyse, or None.
+        end (str): Last yyyymmdd date to analyse, or None.
+        stock (Stock): The stock to analyse.
+
+    Return:
+        tuple<str, object>: The stock code and the result of the analysis, or
+        None if the stock has no trading data between 'start' and 'end'.
+    """
+    first, last = stock._bounds(start, end)
+    if first == last :
+        return None
+    return str(stock), stock._feed(analyser_factory(),
+                                   stock.columns(start, end), result=True)
+
+
+def _analyse_in_worker(analyser_factory, start, end, instrumented, stock) :
+    """Analyse one stock with a new analyser, for use by a worker process.
+
+    Parameters:
+        instrumented (bool): Whether the parent process is recording events.
+        Other parameters are those of '_analyse_stock'.
+
+    Return:
+        tuple: The result of '_analyse_stock' and the events recorded.
+    """
+    events = _worker_events(instrumented)
+    return _analyse_stock(analyser_factory, start, end, stock), events
+
+
+def _buffer_writer(buffer) :
+    """Return a function that writes successive pieces of data into
+        'buffer', from its start.
+    """
+    position = 0
+
+    def write(data) :
+        nonlocal position
+        data = memoryview(data).cast("B")
+        buffer[position:position + len(data)] = data
+        position += len(data)
+    return write
+
+
+def _map_shared(memory) :
+    """Return a read-only memory map of a shared memory block.
+
+    The map does not belong to 'memory', so 'memory' can be closed while views
+    of the map are in use. Like the map of a snapshot file, it is unmapped
+    when the last view of it is released.
+
+    Parameters:
+        memory (SharedMemory): The attached block.
+
+    Return:
+        mmap: The contents of the block.
+    """
+    if os.name == "nt" :
+        return mmap.mmap(-1, memory.size, tagname=memory.name,
+                         access=mmap.ACCESS_READ)
+    # SharedMemory does not expose its file descriptor publicly.
+    return mmap.mmap(memory._fd, memory.size, access=mmap.ACCESS_READ)
+
+
+def _close_shared(memory) :
+    """Close and remove a shared memory block, if it still exists."""
+    memory.close()
+    try :
+        memory.unlink()
+    except FileNotFoundError :
+        pass
+
+
+# The collection attached to in a worker process of
+# SharedCollection.analyse_all.
+_shared_collection = None
+
+
+def _attach_shared(name) :
+    """Attach a worker process to a shared collection."""
+    global _shared_collection
+    _shared_collection = StockCollection.attach(name)
+
+
+def _analyse_shared(analyser_factory, start, end, instrumented, code) :
+    """Analyse one stock of the attached shared collection with a new
+        analyser, for use by a worker process.
+
+    Return:
+        tuple: The result of '_analyse_stock' and the events recorded.
+    """
+    return _analyse_in_worker(analyser_factory, start, end, instrumented,
+                              _shared_collection._all_stocks[code])
+
+
+def _load_file(loader, filename, instrumented) :
+    """Load one file into a new collection, for use by a worker process.
+
+    Parameters:
+        loader (type): The Loader subclass used to load the file.
+        filename (str): Name of the file from which to load data.
+        instrumented (bool): Whether the parent process is recording events.
+
+    Return:
+        tuple<StockCollection, list>: The data loaded from the file and the
+        events recorded.
+    """
+    events = _worker_events(instrumented)
+    stocks = StockCollection()
+    loader(filename, stocks)
+    return stocks, events
+
+
 if __name__ == "__main__" :
     print("This module provides utility functions for the stock market",
           "analysis program and is not meant to be executed on its own.")